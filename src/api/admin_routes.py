@@ -1,15 +1,14 @@
 from fastapi import APIRouter, HTTPException, Depends, Header
 from typing import Optional
 from src.core.models import AdminRegister, AdminLogin, TokenCreate
-from src.auth import auth_manager
+from src.auth import auth_manager, analytics
+from src.core import outbox
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
-active_sessions = set()
-
 
 async def verify_admin_session(x_admin_token: Optional[str] = Header(None)):
-    if not x_admin_token or x_admin_token not in active_sessions:
+    if not x_admin_token or not await auth_manager.verify_session(x_admin_token):
         raise HTTPException(status_code=401, detail="Unauthorized - Admin login required")
     return x_admin_token
 
@@ -32,8 +31,7 @@ async def register_admin(admin: AdminRegister):
 async def login_admin(credentials: AdminLogin):
     try:
         if await auth_manager.authenticate_admin(credentials.username, credentials.password):
-            session_token = auth_manager.generate_token()
-            active_sessions.add(session_token)
+            session_token = await auth_manager.create_session(credentials.username)
             return {"message": "Login successful", "session_token": session_token}
         else:
             raise HTTPException(status_code=401, detail="Invalid credentials")
@@ -45,7 +43,7 @@ async def login_admin(credentials: AdminLogin):
 
 @router.post("/logout")
 async def logout_admin(session_token: str = Depends(verify_admin_session)):
-    active_sessions.discard(session_token)
+    await auth_manager.delete_session(session_token)
     return {"message": "Logged out successfully"}
 
 
@@ -64,7 +62,9 @@ async def create_token(token_data: TokenCreate):
         result = await auth_manager.create_api_token(
             name=token_data.name,
             description=token_data.description,
-            expires_in_days=token_data.expires_in_days
+            expires_in_days=token_data.expires_in_days,
+            requests_per_minute=token_data.requests_per_minute,
+            messages_per_minute=token_data.messages_per_minute,
         )
         return {
             "message": "Token created successfully",
@@ -83,6 +83,40 @@ async def list_tokens():
         raise HTTPException(status_code=500, detail=f"Failed to list tokens: {str(e)}")
 
 
+@router.get("/usage", dependencies=[Depends(verify_admin_session)])
+async def token_usage(hours: float = 24):
+    try:
+        return await analytics.usage_report(hours=max(1, min(24 * 30, hours)))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to load usage: {str(e)}")
+
+
+@router.get("/outbox", dependencies=[Depends(verify_admin_session)])
+async def list_outbox(status: str = "dead", limit: int = 100):
+    if status not in ("pending", "sending", "dead"):
+        raise HTTPException(status_code=400, detail="status must be pending, sending or dead")
+    try:
+        records = await outbox.list_records(status=status, limit=max(1, min(500, limit)))
+        return {"records": records, "counts": await outbox.counts()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to load outbox: {str(e)}")
+
+
+@router.get("/metrics", dependencies=[Depends(verify_admin_session)])
+async def delivery_metrics():
+    try:
+        return {"circuits": outbox.circuit_states(), "outbox": await outbox.counts()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to load metrics: {str(e)}")
+
+
+@router.post("/outbox/{record_id}/retry", dependencies=[Depends(verify_admin_session)])
+async def retry_outbox(record_id: str):
+    if await outbox.requeue(record_id):
+        return {"message": "Delivery requeued"}
+    raise HTTPException(status_code=404, detail="Dead delivery not found")
+
+
 @router.patch("/tokens/{token_name}/revoke", dependencies=[Depends(verify_admin_session)])
 async def revoke_token(token_name: str):
     try:
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import math
+import time
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from src.database import database
+from src.core import outbox
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["health"])
+
+# Probe results are reused for this long, so frequent polling from several orchestrators costs one round of probes
+CACHE_SECONDS = 5.0
+PROBE_TIMEOUT_SECONDS = 2.0
+
+started_at = time.time()
+components = {}
+cached = None
+cached_at = 0.0
+probe_lock = asyncio.Lock()
+
+
+def configure(cache_seconds=None):
+    global CACHE_SECONDS
+    if cache_seconds is not None:
+        CACHE_SECONDS = cache_seconds
+
+
+def set_components(**kwargs):
+    """Bots, supervisor, in-flight tracker, edit relay and reaction aggregator, as the probes need them."""
+    components.update(kwargs)
+
+
+def elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+async def probe_database():
+    if not database.ready.is_set():
+        return {"ok": False, "state": "starting"}
+    started = time.perf_counter()
+    client = database.get_client()
+    if client is not None:
+        await client.admin.command("ping")
+    else:
+        await database.get_db().command("ping")
+    return {"ok": True, "latency_ms": elapsed_ms(started)}
+
+
+async def probe_telegram():
+    bot = components.get("tg_bot")
+    client = bot.get_client() if bot else None
+    connected = bool(client and client.is_connected())
+    return {"ok": connected, "connected": connected}
+
+
+async def probe_discord():
+    bot = components.get("dc_bot")
+    client = bot.client if bot else None
+    if client is None or client.is_closed() or not client.is_ready():
+        return {"ok": False, "state": "connecting"}
+    latency = client.latency
+    if math.isnan(latency) or math.isinf(latency):
+        # No heartbeat acknowledged yet
+        return {"ok": False, "state": "connecting"}
+    return {"ok": True, "latency_ms": round(latency * 1000, 1)}
+
+
+async def probe_slack():
+    bot = components.get("slack_bot")
+    client = bot.get_client() if bot else None
+    connected = bool(client and await client.is_connected())
+    return {"ok": connected, "connected": connected}
+
+
+PROBES = {
+    "database": probe_database,
+    "telegram": probe_telegram,
+    "discord": probe_discord,
+    "slack": probe_slack,
+}
+
+
+async def run_probe(probe):
+    try:
+        return await asyncio.wait_for(probe(), PROBE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        return {"ok": False, "error": f"timed out after {PROBE_TIMEOUT_SECONDS}s"}
+    except Exception as e:
+        return {"ok": False, "error": str(e)[:200]}
+
+
+async def queue_depth():
+    inflight = components.get("inflight")
+    edit_relay = components.get("edit_relay")
+    reactions = components.get("reactions")
+    queues = {
+        "in_flight": inflight.count if inflight else 0,
+        "pending_edits": sum(len(d.pending) for d in edit_relay.debouncers.values()) if edit_relay else 0,
+        "pending_reactions": len(reactions.deltas) + len(reactions.totals) if reactions else 0,
+    }
+    if database.ready.is_set():
+        try:
+            queues["outbox"] = await asyncio.wait_for(outbox.counts(), PROBE_TIMEOUT_SECONDS)
+        except Exception as e:
+            logger.warning("Outbox depth probe failed: %s", e)
+    return queues
+
+
+def stopping():
+    supervisor = components.get("supervisor")
+    return bool(supervisor and supervisor.stopping.is_set())
+
+
+async def readiness():
+    global cached, cached_at
+    async with probe_lock:
+        # Callers that queued behind a running probe get its result instead of probing again
+        if cached is not None and time.monotonic() - cached_at < CACHE_SECONDS:
+            return cached
+        names = list(PROBES)
+        results = await asyncio.gather(*(run_probe(PROBES[name]) for name in names))
+        checks = dict(zip(names, results))
+        cached = {
+            "status": "ready" if all(c["ok"] for c in checks.values()) else "not_ready",
+            "checked_at": time.time(),
+            "checks": checks,
+            "queues": await queue_depth(),
+        }
+        cached_at = time.monotonic()
+        return cached
+
+
+@router.get("/healthz")
+async def liveness():
+    """Answers as long as the event loop does; no I/O, so it's safe to poll often."""
+    supervisor = components.get("supervisor")
+    return {
+        "status": "alive",
+        "uptime_seconds": round(time.time() - started_at, 1),
+        "tasks": supervisor.states() if supervisor else {},
+    }
+
+
+@router.get("/readyz")
+async def readiness_check():
+    result = await readiness()
+    if stopping():
+        # Reported straight away, not after the cache expires, so traffic moves off before the drain ends
+        result = {**result, "status": "stopping"}
+    return JSONResponse(result, status_code=200 if result["status"] == "ready" else 503)
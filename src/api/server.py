@@ -1,14 +1,21 @@
-from fastapi import FastAPI, HTTPException, Header, Depends
+from fastapi import FastAPI, HTTPException, Header, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, Response
 from typing import Optional, Dict, Any
+import logging
 import os
+import time
 from src.core.models import MessageCreate, MessageReply
-from src.database import store_functions
-from src.utils.bridge import fwd_to_tg_rply, fwd_dd_with_reply, fwd_to_slack
-from src.auth import auth_manager
+from src.database import database, store_functions, archive
+from src.core import outbox
+from src.auth import auth_manager, rate_limit, analytics
 from src.api.admin_routes import router as admin_router
+from src.api.health_routes import router as health_router
 from src.utils.misc import get_root
+from src.utils.cache import response_cache, etag_matches
+from src.utils.serialize import FastJSONResponse
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="BindSync",
@@ -16,6 +23,7 @@ app = FastAPI(
 )
 
 app.include_router(admin_router)
+app.include_router(health_router)
 
 app.add_middleware(
     CORSMiddleware,
@@ -36,6 +44,9 @@ map_slack_to_tg = None
 map_dc_to_slack = None
 map_tg_to_slack = None
 
+# Served while storage is still starting up; everything else answers 503 until it is ready
+NO_STORAGE_PATHS = {"/", "/admin", "/admin/login", "/admin/dashboard", "/healthz", "/readyz"}
+
 
 def set_runtime(tb, db, sb, config, tg_dc_map, dc_tg_map, slack_dc_map, slack_tg_map, dc_slack_map, tg_slack_map):
     global tg_client, dbot, slack_bot, cfg, map_tg_to_dc, map_dc_to_tg, map_slack_to_dc, map_slack_to_tg, map_dc_to_slack, map_tg_to_slack
@@ -51,36 +62,173 @@ def set_runtime(tb, db, sb, config, tg_dc_map, dc_tg_map, slack_dc_map, slack_tg
     map_tg_to_slack = tg_slack_map
 
 
-async def verify_api_token(x_api_token: Optional[str] = Header(None)):
+@app.middleware("http")
+async def require_storage(request: Request, call_next):
+    if not database.ready.is_set() and request.url.path not in NO_STORAGE_PATHS:
+        return JSONResponse({"detail": "Storage is starting up"}, status_code=503, headers={"Retry-After": "5"})
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def record_token_usage(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    token_data = getattr(request.state, "api_token", None)
+    if token_data:
+        latency_ms = (time.perf_counter() - started) * 1000
+        analytics.record_request(token_data, latency_ms, error=response.status_code >= 400)
+    return response
+
+
+async def verify_api_token(request: Request, x_api_token: Optional[str] = Header(None)):
     if not x_api_token:
         raise HTTPException(status_code=401, detail="API token required in X-API-Token header")
 
-    if not await auth_manager.verify_token(x_api_token):
+    token_data = await auth_manager.verify_token(x_api_token)
+    if not token_data:
         raise HTTPException(status_code=401, detail="Invalid or expired API token")
+    request.state.api_token = token_data
+
+    retry_after = rate_limit.check_request(token_data)
+    if retry_after:
+        raise HTTPException(status_code=429, detail="Request rate limit exceeded", headers={"Retry-After": str(retry_after)})
+
+    return token_data
+
+
+# (platform, config key of its chat, field holding a stored message's id there)
+PLATFORMS = (("telegram", "telegram_chat_id", "tg_msg_id"), ("discord", "discord_channel_id", "dc_msg_id"),
+             ("slack", "slack_channel_id", "slack_ts"))
+
+
+def delivery_targets(target, orig_msg=None):
+    """Platforms an API message goes to: the requested one or every configured one, and for a reply only those
+    where the original message exists."""
+    bots = {"telegram": tg_client, "discord": dbot, "slack": slack_bot}
+    return [
+        platform for platform, chat_key, id_field in PLATFORMS
+        if (target is None or target == platform) and bots[platform] and cfg and chat_key in cfg
+        and (orig_msg is None or orig_msg.get(id_field))
+    ]
 
-    return x_api_token
 
+def charge_messages(token_data, count):
+    # Each platform a message is sent to counts against the quota
+    if not count:
+        return
+    retry_after = rate_limit.check_messages(token_data, count)
+    if retry_after:
+        raise HTTPException(status_code=429, detail="Message quota exceeded", headers={"Retry-After": str(retry_after)})
+    analytics.record_messages(token_data, count)
+
+
+def parse_fields(fields):
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in store_functions.MESSAGE_FIELDS and f != "id"]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return tuple(sorted(f for f in requested if f != "id"))
+
+
+def check_time_range(since, until):
+    for name, value in (("since", since), ("until", until)):
+        if value is not None and not 0 <= value < store_functions.MAX_ID_TIMESTAMP:
+            raise HTTPException(status_code=400, detail=f"{name} must be a Unix timestamp between 1970 and 2106")
+
+
+def cached_response(entry, if_none_match):
+    etag, body = entry
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(etag, if_none_match):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @app.get("/messages", dependencies=[Depends(verify_api_token)])
-async def get_messages(limit: int = 100, offset: int = 0):
+async def get_messages(limit: int = 100, offset: int = 0, before: Optional[str] = None, fields: Optional[str] = None,
+                       if_none_match: Optional[str] = Header(None)):
     limit = max(1, min(200, limit))
     offset = max(0, offset)
-    messages = await store_functions.list_messages(limit=limit, offset=offset)
-    print(messages)
-    return {"messages": messages}
+    field_list = parse_fields(fields)
+    key = f"messages:{limit}:{offset}:{before}:{field_list}"
+    entry = response_cache.get(key)
+    if entry is None:
+        generation = response_cache.generation
+        # Cached pages are read from the primary: a lagging secondary's page would stay cached until the next write
+        messages = await store_functions.list_messages(limit=limit, offset=offset, fields=field_list, before=before,
+                                                       history=False)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("GET /messages limit=%s offset=%s before=%s: %s", limit, offset, before, messages)
+        next_before = messages[-1]["id"] if len(messages) == limit else None
+        entry = response_cache.put(key, {"messages": messages, "next_before": next_before}, generation)
+    return cached_response(entry, if_none_match)
+
+
+@app.get("/messages/search", dependencies=[Depends(verify_api_token)], response_class=FastJSONResponse)
+async def search_messages(q: Optional[str] = None, source: Optional[str] = None, username: Optional[str] = None,
+                          since: Optional[float] = None, until: Optional[float] = None, limit: int = 50,
+                          fields: Optional[str] = None):
+    limit = max(1, min(200, limit))
+    check_time_range(since, until)
+    messages = await store_functions.search_messages(
+        query=q,
+        source=source,
+        username=username,
+        since=since,
+        until=until,
+        limit=limit,
+        fields=parse_fields(fields),
+    )
+    return {"messages": messages, "count": len(messages)}
+
+
+@app.get("/messages/archive", dependencies=[Depends(verify_api_token)], response_class=FastJSONResponse)
+async def search_archive(month: Optional[str] = None, q: Optional[str] = None, source: Optional[str] = None,
+                         username: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None,
+                         limit: int = 50):
+    limit = max(1, min(200, limit))
+    messages = await archive.search_archive(
+        month=month,
+        query=q,
+        source=source,
+        username=username,
+        since=since,
+        until=until,
+        limit=limit,
+    )
+    return {"messages": messages, "count": len(messages)}
 
 
 @app.get("/messages/{message_id}", dependencies=[Depends(verify_api_token)])
-async def get_message(message_id: str):
-    message = await store_functions.get_message(message_id)
-    if not message:
+async def get_message(message_id: str, fields: Optional[str] = None, if_none_match: Optional[str] = Header(None)):
+    field_list = parse_fields(fields)
+    key = f"message:{message_id}:{field_list}"
+    entry = response_cache.get(key)
+    if entry is None:
+        generation = response_cache.generation
+        message = await store_functions.get_message(message_id, fields=field_list)
+        if not message:
+            message = await archive.find_archived(message_id, fields=field_list)
+        if not message:
+            raise HTTPException(status_code=404, detail="Message not found")
+        entry = response_cache.put(key, message, generation)
+    return cached_response(entry, if_none_match)
+
+
+@app.get("/messages/{message_id}/thread", dependencies=[Depends(verify_api_token)], response_class=FastJSONResponse)
+async def get_thread(message_id: str):
+    thread = await store_functions.get_thread(message_id)
+    if not thread:
         raise HTTPException(status_code=404, detail="Message not found")
-    return message
+    return thread
 
 
-@app.post("/messages", dependencies=[Depends(verify_api_token)])
-async def create_message(msg: MessageCreate):
+@app.post("/messages")
+async def create_message(msg: MessageCreate, token_data: dict = Depends(verify_api_token)):
+    targets = delivery_targets(msg.target)
+    charge_messages(token_data, len(targets))
     msg_id = await store_functions.add_message(
         source='api',
         text=msg.text,
@@ -105,31 +253,22 @@ async def create_message(msg: MessageCreate):
     dc_msg_id = None
     slack_ts = None
 
-    if (msg.target is None or msg.target == 'telegram') and tg_client and cfg and "telegram_chat_id" in cfg:
-        tg_msg_id = await fwd_to_tg_rply(
-            tg_client, cfg["telegram_chat_id"], formatted_msg,
-            msg_id=reply_to_tg_id
-        )
+    if "telegram" in targets:
+        tg_msg_id = await outbox.deliver("telegram", formatted_msg, reply_to=reply_to_tg_id, internal_id=msg_id)
         if tg_msg_id:
             await store_functions.set_tg_msg_id(msg_id, int(tg_msg_id))
 
     
-    if (msg.target is None or msg.target == 'discord') and dbot and cfg and "discord_channel_id" in cfg:
-        dc_msg_id = await fwd_dd_with_reply(
-            dbot, cfg["discord_channel_id"], formatted_msg,
-            message_id=reply_to_dc_id
-        )
+    if "discord" in targets:
+        dc_msg_id = await outbox.deliver("discord", formatted_msg, reply_to=reply_to_dc_id, internal_id=msg_id)
         if dc_msg_id:
             await store_functions.set_dc_msg_id(msg_id, int(dc_msg_id))
 
 
-    if (msg.target is None or msg.target == 'slack') and slack_bot and cfg and "slack_channel_id" in cfg:
-        slack_ts = await fwd_to_slack(
-            slack_bot, formatted_msg,
-            slack_ts=reply_to_slack_ts
-        )
+    if "slack" in targets:
+        slack_ts = await outbox.deliver("slack", formatted_msg, reply_to=reply_to_slack_ts, internal_id=msg_id)
         if slack_ts:
-            await store_functions.set_slack_ts_for_dc(msg_id, slack_ts)
+            await store_functions.set_slack_ts(msg_id, slack_ts)
 
 
     if tg_msg_id and dc_msg_id and map_tg_to_dc is not None and map_dc_to_tg is not None:
@@ -147,11 +286,13 @@ async def create_message(msg: MessageCreate):
     return {"id": msg_id, "tg_msg_id": tg_msg_id, "dc_msg_id": dc_msg_id, "slack_ts": slack_ts}
 
 
-@app.post("/messages/{message_id}/reply", dependencies=[Depends(verify_api_token)])
-async def reply_to_message(message_id: str, reply: MessageReply):
+@app.post("/messages/{message_id}/reply")
+async def reply_to_message(message_id: str, reply: MessageReply, token_data: dict = Depends(verify_api_token)):
     orig_msg = await store_functions.get_message(message_id)
     if not orig_msg:
         raise HTTPException(status_code=404, detail="Original message not found")
+    targets = delivery_targets(reply.target, orig_msg)
+    charge_messages(token_data, len(targets))
 
     reply_id = await store_functions.add_message(
         source='api_reply',
@@ -167,31 +308,22 @@ async def reply_to_message(message_id: str, reply: MessageReply):
     slack_ts = None
 
 
-    if (reply.target is None or reply.target == 'telegram') and tg_client and cfg and "telegram_chat_id" in cfg and orig_msg.get("tg_msg_id"):
-        tg_msg_id = await fwd_to_tg_rply(
-            tg_client, cfg["telegram_chat_id"], formatted_reply,
-            msg_id=orig_msg.get("tg_msg_id")
-        )
+    if "telegram" in targets:
+        tg_msg_id = await outbox.deliver("telegram", formatted_reply, reply_to=orig_msg.get("tg_msg_id"), internal_id=reply_id)
         if tg_msg_id:
             await store_functions.set_tg_msg_id(reply_id, int(tg_msg_id))
 
 
-    if (reply.target is None or reply.target == 'discord') and dbot and cfg and "discord_channel_id" in cfg and orig_msg.get("dc_msg_id"):
-        dc_msg_id = await fwd_dd_with_reply(
-            dbot, cfg["discord_channel_id"], formatted_reply,
-            message_id=orig_msg.get("dc_msg_id")
-        )
+    if "discord" in targets:
+        dc_msg_id = await outbox.deliver("discord", formatted_reply, reply_to=orig_msg.get("dc_msg_id"), internal_id=reply_id)
         if dc_msg_id:
             await store_functions.set_dc_msg_id(reply_id, int(dc_msg_id))
 
 
-    if (reply.target is None or reply.target == 'slack') and slack_bot and cfg and "slack_channel_id" in cfg and orig_msg.get("slack_ts"):
-        slack_ts = await fwd_to_slack(
-            slack_bot, formatted_reply,
-            slack_ts=orig_msg.get("slack_ts")
-        )
+    if "slack" in targets:
+        slack_ts = await outbox.deliver("slack", formatted_reply, reply_to=orig_msg.get("slack_ts"), internal_id=reply_id)
         if slack_ts:
-            await store_functions.set_slack_ts_for_dc(reply_id, slack_ts)
+            await store_functions.set_slack_ts(reply_id, slack_ts)
 
 
     if tg_msg_id and dc_msg_id and map_tg_to_dc is not None and map_dc_to_tg is not None:
@@ -0,0 +1,148 @@
+import asyncio
+import bisect
+import logging
+import time
+from typing import Dict, List, Optional
+from src.database.database import get_db
+
+logger = logging.getLogger(__name__)
+
+BUCKET_SECONDS = 300
+FLUSH_INTERVAL_SECONDS = 30
+# Upper bounds (ms) of the latency histogram bins; the last bin is open-ended
+LATENCY_BOUNDS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+pending: Dict[tuple, Dict] = {}
+
+
+def _bucket(token_data: Dict, now: Optional[float] = None) -> Dict:
+    now = time.time() if now is None else now
+    start = int(now - now % BUCKET_SECONDS)
+    key = (token_data.get("token_hash", ""), start)
+    bucket = pending.get(key)
+    if bucket is None:
+        bucket = pending[key] = {
+            "token_name": token_data.get("name"),
+            "requests": 0,
+            "messages": 0,
+            "errors": 0,
+            "latency_hist": [0] * (len(LATENCY_BOUNDS_MS) + 1),
+        }
+    return bucket
+
+
+def record_request(token_data: Dict, latency_ms: float, error: bool = False) -> None:
+    bucket = _bucket(token_data)
+    bucket["requests"] += 1
+    if error:
+        bucket["errors"] += 1
+    bucket["latency_hist"][bisect.bisect_left(LATENCY_BOUNDS_MS, latency_ms)] += 1
+
+
+def record_messages(token_data: Dict, count: int) -> None:
+    _bucket(token_data)["messages"] += count
+
+
+def percentile(hist: List[int], pct: float) -> Optional[float]:
+    """Upper bound of the histogram bin holding the pct-th sample (None for the open-ended bin)."""
+    total = sum(hist)
+    if not total:
+        return None
+    rank = pct / 100 * total
+    seen = 0
+    for i, count in enumerate(hist):
+        seen += count
+        if seen >= rank:
+            return LATENCY_BOUNDS_MS[i] if i < len(LATENCY_BOUNDS_MS) else None
+    return None
+
+
+def _requeue(key: tuple, bucket: Dict) -> None:
+    """Merge an unflushed bucket back into `pending`, which may have picked up new counts meanwhile."""
+    current = pending.get(key)
+    if current is None:
+        pending[key] = bucket
+        return
+    for field in ("requests", "messages", "errors"):
+        current[field] += bucket[field]
+    current["latency_hist"] = [a + b for a, b in zip(current["latency_hist"], bucket["latency_hist"])]
+
+
+async def flush() -> None:
+    global pending
+    if not pending:
+        return
+    db = get_db()
+    batch, pending = pending, {}
+    for (token_hash, start), bucket in batch.items():
+        inc = {
+            "requests": bucket["requests"],
+            "messages": bucket["messages"],
+            "errors": bucket["errors"],
+        }
+        for i, count in enumerate(bucket["latency_hist"]):
+            if count:
+                inc[f"latency_hist.{i}"] = count
+        try:
+            await db.token_usage.update_one(
+                {"_id": f"{token_hash}:{start}"},
+                {
+                    "$inc": inc,
+                    "$set": {"token_name": bucket["token_name"]},
+                    "$setOnInsert": {"token_hash": token_hash, "bucket_start": start},
+                },
+                upsert=True,
+            )
+        except Exception as e:
+            logger.error("Failed to flush token usage bucket: %s", e)
+            _requeue((token_hash, start), bucket)
+
+
+async def flush_loop(interval: float = FLUSH_INTERVAL_SECONDS) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        await flush()
+
+
+async def usage_report(hours: float = 24) -> Dict:
+    await flush()
+    db = get_db()
+    since = int(time.time() - hours * 3600)
+    tokens: Dict[str, Dict] = {}
+    series: Dict[int, Dict] = {}
+
+    async for doc in db.token_usage.find({"bucket_start": {"$gte": since}}):
+        hist = [0] * (len(LATENCY_BOUNDS_MS) + 1)
+        for i, count in (doc.get("latency_hist") or {}).items():
+            hist[int(i)] += count
+
+        token = tokens.setdefault(doc["token_hash"], {
+            "name": doc.get("token_name"),
+            "requests": 0,
+            "messages": 0,
+            "errors": 0,
+            "latency_hist": [0] * len(hist),
+        })
+        point = series.setdefault(doc["bucket_start"], {"bucket_start": doc["bucket_start"], "requests": 0, "messages": 0, "errors": 0})
+        for field in ("requests", "messages", "errors"):
+            token[field] += doc.get(field, 0)
+            point[field] += doc.get(field, 0)
+        token["latency_hist"] = [a + b for a, b in zip(token["latency_hist"], hist)]
+
+    report = []
+    for token in tokens.values():
+        hist = token.pop("latency_hist")
+        token["latency_ms"] = {
+            "p50": percentile(hist, 50),
+            "p95": percentile(hist, 95),
+            "p99": percentile(hist, 99),
+        }
+        report.append(token)
+    report.sort(key=lambda t: t["requests"], reverse=True)
+
+    return {
+        "hours": hours,
+        "bucket_seconds": BUCKET_SECONDS,
+        "tokens": report,
+        "series": [series[k] for k in sorted(series)],
+    }
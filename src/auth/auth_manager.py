@@ -1,8 +1,11 @@
+import time
 import secrets
 import hashlib
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Dict, List
 from src.database.database import get_db
+from src.auth import rate_limit
 
 
 def hash_password(password: str) -> str:
@@ -13,6 +16,61 @@ def generate_token() -> str:
     return secrets.token_urlsafe(32)
 
 
+TOKEN_PREFIX_LENGTH = 8
+# Set from API_TOKEN_SECRET by configure(); load_config has already checked it fits BLAKE2b's 64-byte key limit
+TOKEN_HASH_KEY = b""
+
+SESSION_TTL = timedelta(hours=12)
+# How long a worker trusts its cached view of a session before re-reading (and extending) it in Mongo
+SESSION_RECHECK_SECONDS = 60
+# Evicting a live session only costs it one extra read
+SESSION_CACHE_MAX_ENTRIES = 1024
+session_cache = OrderedDict()
+
+
+def hash_token(token: str) -> str:
+    return hashlib.blake2b(token.encode(), key=TOKEN_HASH_KEY, digest_size=32).hexdigest()
+
+
+def cache_session(digest: str, expires_at: datetime) -> None:
+    session_cache[digest] = {"expires_at": expires_at, "checked": time.monotonic()}
+    session_cache.move_to_end(digest)
+    if len(session_cache) <= SESSION_CACHE_MAX_ENTRIES:
+        return
+    now = datetime.now(timezone.utc)
+    for key in [key for key, entry in session_cache.items() if entry["expires_at"] <= now]:
+        del session_cache[key]
+    while len(session_cache) > SESSION_CACHE_MAX_ENTRIES:
+        session_cache.popitem(last=False)
+
+
+async def configure(session_ttl_hours: Optional[float] = None, token_secret: Optional[str] = None) -> None:
+    global SESSION_TTL, TOKEN_HASH_KEY
+    if session_ttl_hours:
+        SESSION_TTL = timedelta(hours=session_ttl_hours)
+    if token_secret is not None:
+        TOKEN_HASH_KEY = token_secret.encode()
+    # Runs before indexes.ensure_indexes so legacy tokens have a token_hash when the unique index is built
+    await migrate_tokens()
+
+
+async def migrate_tokens() -> int:
+    """Replace any raw tokens left from older versions with their digest and display prefix."""
+    db = get_db()
+    migrated = 0
+    async for token_data in db.api_tokens.find({"token": {"$exists": True}}):
+        raw = token_data["token"] or ""
+        await db.api_tokens.update_one(
+            {"_id": token_data["_id"]},
+            {
+                "$set": {"token_hash": hash_token(raw), "token_prefix": raw[:TOKEN_PREFIX_LENGTH]},
+                "$unset": {"token": ""},
+            }
+        )
+        migrated += 1
+    return migrated
+
+
 async def admin_exists() -> bool:
     db = get_db()
     admin = await db.admins.find_one({})
@@ -48,8 +106,76 @@ async def authenticate_admin(username: str, password: str) -> bool:
     return admin["password"] == password_hash
 
 
+def as_utc(value: datetime) -> datetime:
+    # Motor hands back naive datetimes unless the client is tz-aware
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+async def create_session(username: str) -> str:
+    db = get_db()
+    session_token = generate_token()
+    digest = hash_token(session_token)
+    now = datetime.now(timezone.utc)
+    expires_at = now + SESSION_TTL
+
+    await db.admin_sessions.insert_one({
+        "session_hash": digest,
+        "username": username,
+        "created_at": now,
+        "expires_at": expires_at,
+    })
+    cache_session(digest, expires_at)
+    return session_token
+
+
+async def verify_session(session_token: str) -> bool:
+    digest = hash_token(session_token)
+    now = datetime.now(timezone.utc)
+    entry = session_cache.get(digest)
+
+    if entry and time.monotonic() - entry["checked"] < SESSION_RECHECK_SECONDS:
+        if entry["expires_at"] <= now:
+            session_cache.pop(digest, None)
+            return False
+        entry["expires_at"] = now + SESSION_TTL
+        session_cache.move_to_end(digest)
+        return True
+
+    db = get_db()
+    session = await db.admin_sessions.find_one({"session_hash": digest})
+    if not session:
+        session_cache.pop(digest, None)
+        return False
+
+    expires_at = as_utc(session["expires_at"])
+    if entry:
+        expires_at = max(expires_at, entry["expires_at"])
+    if expires_at <= now:
+        session_cache.pop(digest, None)
+        return False
+
+    expires_at = now + SESSION_TTL
+    await db.admin_sessions.update_one(
+        {"_id": session["_id"]},
+        {"$set": {"expires_at": expires_at}}
+    )
+    cache_session(digest, expires_at)
+    return True
+
+
+async def delete_session(session_token: str) -> None:
+    db = get_db()
+    digest = hash_token(session_token)
+    session_cache.pop(digest, None)
+    await db.admin_sessions.delete_one({"session_hash": digest})
+
+
 async def create_api_token(name: str, description: Optional[str] = None,
-                           expires_in_days: Optional[int] = None) -> Dict:
+                           expires_in_days: Optional[int] = None,
+                           requests_per_minute: Optional[int] = None,
+                           messages_per_minute: Optional[int] = None) -> Dict:
     db = get_db()
 
     token = generate_token()
@@ -60,13 +186,17 @@ async def create_api_token(name: str, description: Optional[str] = None,
         expires_at = created_at + timedelta(days=expires_in_days)
 
     token_data = {
-        "token": token,
+        "token_hash": hash_token(token),
+        "token_prefix": token[:TOKEN_PREFIX_LENGTH],
         "name": name,
         "description": description,
         "created_at": created_at.isoformat(),
         "expires_at": expires_at.isoformat() if expires_at else None,
         "is_active": True,
         "last_used": None,
+        "requests_per_minute": requests_per_minute,
+        "messages_per_minute": messages_per_minute,
+        "usage": {"requests": 0, "messages": 0},
     }
 
     await db.api_tokens.insert_one(token_data)
@@ -78,28 +208,29 @@ async def create_api_token(name: str, description: Optional[str] = None,
         "created_at": token_data["created_at"],
         "expires_at": token_data["expires_at"],
         "is_active": True,
+        "requests_per_minute": requests_per_minute,
+        "messages_per_minute": messages_per_minute,
     }
 
 
-async def verify_token(token: str) -> bool:
+async def verify_token(token: str) -> Optional[Dict]:
+    """Return the token record for an active, unexpired token, or None.
+
+    last_used and usage counters are written in batches by rate_limit.flush_usage.
+    """
     db = get_db()
 
-    token_data = await db.api_tokens.find_one({"token": token, "is_active": True})
+    token_data = await db.api_tokens.find_one({"token_hash": hash_token(token), "is_active": True})
 
     if not token_data:
-        return False
+        return None
 
     if token_data.get("expires_at"):
         expires_at = datetime.fromisoformat(token_data["expires_at"])
         if datetime.now(timezone.utc) > expires_at:
-            return False
+            return None
 
-    await db.api_tokens.update_one(
-        {"token": token},
-        {"$set": {"last_used": datetime.now(timezone.utc).isoformat()}}
-    )
-
-    return True
+    return token_data
 
 
 async def list_tokens() -> List[Dict]:
@@ -110,11 +241,17 @@ async def list_tokens() -> List[Dict]:
         tokens.append({
             "name": token_data["name"],
             "description": token_data.get("description"),
-            "token_preview": token_data["token"][:8] + "..." if token_data["token"] else "",
+            "token_preview": token_data["token_prefix"] + "..." if token_data.get("token_prefix") else "",
             "created_at": token_data["created_at"],
             "expires_at": token_data.get("expires_at"),
             "is_active": token_data["is_active"],
             "last_used": token_data.get("last_used"),
+            "requests_per_minute": token_data.get("requests_per_minute"),
+            "messages_per_minute": token_data.get("messages_per_minute"),
+            "usage": {
+                **token_data.get("usage", {"requests": 0, "messages": 0}),
+                **rate_limit.snapshot(token_data.get("token_hash", "")),
+            },
         })
 
     return tokens
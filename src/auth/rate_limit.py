@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import math
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from src.database.database import get_db
+
+logger = logging.getLogger(__name__)
+
+WINDOW_SECONDS = 60.0
+DEFAULT_REQUESTS_PER_MINUTE = 120
+DEFAULT_MESSAGES_PER_MINUTE = 30
+SYNC_INTERVAL_SECONDS = 30
+
+
+class SlidingWindowLimiter:
+    """Approximate sliding window: the previous fixed window is weighted by how much of it still overlaps."""
+
+    def __init__(self, window: float = WINDOW_SECONDS):
+        self.window = window
+        self.counters = {}
+
+    def _counter(self, key, now):
+        start = now - (now % self.window)
+        counter = self.counters.get(key)
+        if counter is None:
+            counter = self.counters[key] = [start, 0, 0]
+        elif counter[0] != start:
+            previous = counter[1] if start - counter[0] == self.window else 0
+            counter[0], counter[1], counter[2] = start, 0, previous
+        return counter
+
+    def usage(self, key, now: Optional[float] = None) -> float:
+        now = time.time() if now is None else now
+        start, current, previous = self._counter(key, now)
+        overlap = 1 - (now - start) / self.window
+        return current + previous * overlap
+
+    def hit(self, key, limit: int, cost: int = 1, now: Optional[float] = None) -> float:
+        """Record `cost` hits and return 0, or the seconds to wait if that would exceed `limit`."""
+        now = time.time() if now is None else now
+        counter = self._counter(key, now)
+        if limit and self.usage(key, now) + cost > limit:
+            return max(1.0, counter[0] + self.window - now)
+        counter[1] += cost
+        return 0.0
+
+
+request_limiter = SlidingWindowLimiter()
+message_limiter = SlidingWindowLimiter()
+pending_usage: Dict[str, Dict[str, int]] = {}
+
+
+def configure(requests_per_minute: Optional[int] = None, messages_per_minute: Optional[int] = None) -> None:
+    global DEFAULT_REQUESTS_PER_MINUTE, DEFAULT_MESSAGES_PER_MINUTE
+    if requests_per_minute is not None:
+        DEFAULT_REQUESTS_PER_MINUTE = requests_per_minute
+    if messages_per_minute is not None:
+        DEFAULT_MESSAGES_PER_MINUTE = messages_per_minute
+
+
+def _limit(token_data: Dict, field: str, default: int) -> int:
+    value = token_data.get(field)
+    return default if value is None else value
+
+
+def _record(token_hash: str, field: str, amount: int) -> None:
+    usage = pending_usage.setdefault(token_hash, {"requests": 0, "messages": 0})
+    usage[field] += amount
+
+
+def check_request(token_data: Dict) -> int:
+    """Count one API request against the token; returns a Retry-After in seconds when over quota."""
+    key = token_data["token_hash"]
+    retry_after = request_limiter.hit(key, _limit(token_data, "requests_per_minute", DEFAULT_REQUESTS_PER_MINUTE))
+    if retry_after:
+        return math.ceil(retry_after)
+    _record(key, "requests", 1)
+    return 0
+
+
+def check_messages(token_data: Dict, count: int) -> int:
+    """Count `count` outbound platform sends against the token's message quota."""
+    key = token_data["token_hash"]
+    retry_after = message_limiter.hit(key, _limit(token_data, "messages_per_minute", DEFAULT_MESSAGES_PER_MINUTE), cost=count)
+    if retry_after:
+        return math.ceil(retry_after)
+    _record(key, "messages", count)
+    return 0
+
+
+def snapshot(token_hash: str) -> Dict:
+    pending = pending_usage.get(token_hash, {})
+    return {
+        "requests_last_minute": round(request_limiter.usage(token_hash)),
+        "messages_last_minute": round(message_limiter.usage(token_hash)),
+        "unsynced_requests": pending.get("requests", 0),
+        "unsynced_messages": pending.get("messages", 0),
+    }
+
+
+async def flush_usage() -> None:
+    global pending_usage
+    if not pending_usage:
+        return
+    db = get_db()
+    batch, pending_usage = pending_usage, {}
+    last_used = datetime.now(timezone.utc).isoformat()
+    for token_hash, usage in batch.items():
+        try:
+            await db.api_tokens.update_one(
+                {"token_hash": token_hash},
+                {
+                    "$inc": {"usage.requests": usage["requests"], "usage.messages": usage["messages"]},
+                    "$set": {"last_used": last_used},
+                }
+            )
+        except Exception as e:
+            logger.error("Failed to sync token usage: %s", e)
+            for field, amount in usage.items():
+                _record(token_hash, field, amount)
+
+
+async def sync_loop(interval: float = SYNC_INTERVAL_SECONDS) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        await flush_usage()
@@ -1,6 +1,10 @@
+import logging
 import discord
 from src.utils.bridge import istg, isslack, ddformat
 from src.database import store_functions
+from src.utils import media
+
+logger = logging.getLogger(__name__)
 
 class DiscordBot:
     def __init__(self, channel_id):
@@ -12,6 +16,8 @@ class DiscordBot:
         self.map_dc_to_tg = {}
         self.map_slack_to_dc = {}
         self.map_dc_to_slack = {}
+        self.edit_relay = None
+        self.reactions = None
         self.intents = discord.Intents.default()
         self.intents.message_content = True
 
@@ -19,6 +25,12 @@ class DiscordBot:
         self.forward_to_telegram = telegram_callback
         self.forward_to_slack = slack_callback
 
+    def set_edit_relay(self, edit_relay):
+        self.edit_relay = edit_relay
+
+    def set_reaction_aggregator(self, reactions):
+        self.reactions = reactions
+
     def set_message_maps(self, tg_to_dc, dc_to_tg, slack_to_dc, dc_to_slack):
         self.map_tg_to_dc = tg_to_dc
         self.map_dc_to_tg = dc_to_tg
@@ -27,9 +39,9 @@ class DiscordBot:
 
     async def on_ready(self):
        if self.client.get_channel(self.channel_id):
-           print("Connected to Discord channel")
+           logger.info("Connected to Discord channel %s", self.channel_id)
        else :
-           print("Discord: channel not found")
+           logger.warning("Discord: channel %s not found", self.channel_id)
 
     async def on_message(self, message):
         if message.author == self.client.user:
@@ -38,6 +50,12 @@ class DiscordBot:
             return
         if istg(message.content or "") or isslack(message.content or ""):
             return
+        attachments = [
+            media.Attachment(a.filename, a.size, a.content_type, lambda url=a.url: media.http_chunks(url), key=f"dc:{a.id}")
+            for a in message.attachments
+        ]
+        if not message.content and not attachments:
+            return
 
         msg = ddformat(message.author.display_name, message.content or "")
 
@@ -57,7 +75,7 @@ class DiscordBot:
                 reply_to_internal_id = None
 
         dc_msg_id = message.id
-        await store_functions.add_message(
+        internal_id = await store_functions.add_message(
             source='discord',
             text=message.content or "",
             username=message.author.display_name,
@@ -66,29 +84,72 @@ class DiscordBot:
             reply_to_tg_id=rly_tg_message_id,
             reply_to_slack_ts=rly_slack_ts,
             reply_to_id=reply_to_internal_id,
+            # The message's own time, so one replayed by backfill sorts where it was sent
+            timestamp=message.created_at.timestamp(),
+            attachments=[a.describe() for a in attachments] or None,
         )
+        if internal_id is None:
+            # Already stored, and relayed, by the live handler or startup backfill
+            return
 
+        async with media.relay(attachments) as (files, skipped):
+            msg += media.skipped_note(skipped)
 
-        if self.forward_to_telegram:
-            tg_msg_id = await self.forward_to_telegram(msg, reply_to_telegram_message_id=rly_tg_message_id)
-            if tg_msg_id:
-                self.map_dc_to_tg[dc_msg_id] = tg_msg_id
-                self.map_tg_to_dc[tg_msg_id] = dc_msg_id
-                await store_functions.set_tg_id_for_dc(dc_msg_id, int(tg_msg_id))
+            if self.forward_to_telegram:
+                tg_msg_id = await self.forward_to_telegram(msg, reply_to_telegram_message_id=rly_tg_message_id, files=files, internal_id=internal_id)
+                if tg_msg_id:
+                    self.map_dc_to_tg[dc_msg_id] = tg_msg_id
+                    self.map_tg_to_dc[tg_msg_id] = dc_msg_id
+                    await store_functions.set_tg_id_for_dc(dc_msg_id, int(tg_msg_id))
 
 
-        if self.forward_to_slack:
-            slack_ts = await self.forward_to_slack(msg, reply_to_slack_ts=rly_slack_ts)
-            if slack_ts:
-                self.map_dc_to_slack[dc_msg_id] = slack_ts
-                self.map_slack_to_dc[slack_ts] = dc_msg_id
-                await store_functions.set_slack_ts_for_dc(dc_msg_id, slack_ts)
+            if self.forward_to_slack:
+                slack_ts = await self.forward_to_slack(msg, reply_to_slack_ts=rly_slack_ts, files=files, internal_id=internal_id)
+                if slack_ts:
+                    self.map_dc_to_slack[dc_msg_id] = slack_ts
+                    self.map_slack_to_dc[slack_ts] = dc_msg_id
+                    await store_functions.set_slack_ts_for_dc(dc_msg_id, slack_ts)
+
+    async def on_raw_message_edit(self, payload):
+        if not self.edit_relay or payload.channel_id != self.channel_id:
+            return
+        data = payload.data
+        # Embed-only updates carry no content
+        if "content" not in data:
+            return
+        if str(data.get("author", {}).get("id")) == str(self.client.user.id):
+            return
+        if istg(data["content"]) or isslack(data["content"]):
+            return
+        await self.edit_relay.edited("discord", payload.message_id, data["content"])
+
+    async def on_raw_message_delete(self, payload):
+        if not self.edit_relay or payload.channel_id != self.channel_id:
+            return
+        await self.edit_relay.deleted("discord", payload.message_id)
+
+    def reaction_name(self, emoji):
+        return str(emoji) if emoji.is_unicode_emoji() else f":{emoji.name}:"
+
+    async def on_raw_reaction_add(self, payload):
+        if not self.reactions or payload.channel_id != self.channel_id or payload.user_id == self.client.user.id:
+            return
+        self.reactions.added("discord", payload.message_id, self.reaction_name(payload.emoji))
+
+    async def on_raw_reaction_remove(self, payload):
+        if not self.reactions or payload.channel_id != self.channel_id or payload.user_id == self.client.user.id:
+            return
+        self.reactions.removed("discord", payload.message_id, self.reaction_name(payload.emoji))
 
     def create_client(self):
         self.client = discord.Client(intents=self.intents)
 
         self.client.event(self.on_ready)
         self.client.event(self.on_message)
+        self.client.event(self.on_raw_message_edit)
+        self.client.event(self.on_raw_message_delete)
+        self.client.event(self.on_raw_reaction_add)
+        self.client.event(self.on_raw_reaction_remove)
 
         return self.client
 
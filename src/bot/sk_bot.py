@@ -1,9 +1,14 @@
+import logging
 from slack_sdk.socket_mode.aiohttp import SocketModeClient
 from slack_sdk.socket_mode.request import SocketModeRequest
 from slack_sdk.socket_mode.response import SocketModeResponse
 from slack_sdk.web.async_client import AsyncWebClient
 from src.database import store_functions
 from src.utils.bridge import isdd, istg
+from src.utils import media
+from src.core.reactions import slack_emoji
+
+logger = logging.getLogger(__name__)
 
 
 class SlackBot:
@@ -20,6 +25,14 @@ class SlackBot:
         self.map_dc_to_slack = {}
         self.map_tg_to_slack = {}
         self.bot_user_id = None
+        self.edit_relay = None
+        self.reactions = None
+
+    def set_edit_relay(self, edit_relay):
+        self.edit_relay = edit_relay
+
+    def set_reaction_aggregator(self, reactions):
+        self.reactions = reactions
 
     def set_forward_callbacks(self, forward_to_discord=None, forward_to_telegram=None):
         self.forward_to_discord = forward_to_discord
@@ -35,7 +48,19 @@ class SlackBot:
         if event.get("type") != "message":
             return
 
-        if event.get("subtype") in ["bot_message", "message_changed"]:
+        if event.get("subtype") == "message_changed":
+            await self.process_edit(event)
+            return
+
+        if event.get("subtype") == "message_deleted":
+            await self.process_delete(event)
+            return
+
+        await self.relay_message(event)
+
+    async def relay_message(self, event):
+        """Store and forward one new channel message; shared by the live handler and startup backfill."""
+        if event.get("subtype") == "bot_message":
             return
 
         if event.get("user") == self.bot_user_id:
@@ -45,6 +70,9 @@ class SlackBot:
             return
 
         text = event.get("text", "")
+        attachments = self.file_attachments(event)
+        if not text and not attachments:
+            return
 
         if isdd(text) or istg(text):
             return
@@ -71,7 +99,7 @@ class SlackBot:
                 reply_to_internal_id = None
 
         # Store message in database
-        await store_functions.add_message(
+        internal_id = await store_functions.add_message(
             source='slack',
             text=text,
             username=username,
@@ -79,22 +107,63 @@ class SlackBot:
             reply_to_slack_ts=reply_to_slack_ts,
             reply_to_tg_id=reply_to_tg_id,
             reply_to_id=reply_to_internal_id,
+            # The message's own time, so one replayed by backfill sorts where it was sent
+            timestamp=float(slack_ts) if slack_ts else None,
+            attachments=[a.describe() for a in attachments] or None,
         )
+        if internal_id is None:
+            # Already stored, and relayed, by the live handler or startup backfill
+            return
 
-        # Forward to Discord
-        if self.forward_to_discord:
-            dc_msg_id = await self.forward_to_discord(msg_dc, reply_to_discord_message_id=reply_to_dc_id)
-            if dc_msg_id:
-                self.map_slack_to_dc[slack_ts] = dc_msg_id
-                self.map_dc_to_slack[dc_msg_id] = slack_ts
-                await store_functions.set_dc_id_for_slack(slack_ts, int(dc_msg_id))
-
-        if self.forward_to_telegram:
-            tg_msg_id = await self.forward_to_telegram(msg_tg, reply_to_telegram_message_id=reply_to_tg_id)
-            if tg_msg_id:
-                self.map_slack_to_tg[slack_ts] = tg_msg_id
-                self.map_tg_to_slack[tg_msg_id] = slack_ts
-                await store_functions.set_tg_id_for_slack(slack_ts, int(tg_msg_id))
+        async with media.relay(attachments) as (files, skipped):
+            msg_dc += media.skipped_note(skipped)
+            msg_tg += media.skipped_note(skipped)
+
+            # Forward to Discord
+            if self.forward_to_discord:
+                dc_msg_id = await self.forward_to_discord(msg_dc, reply_to_discord_message_id=reply_to_dc_id, files=files, internal_id=internal_id)
+                if dc_msg_id:
+                    self.map_slack_to_dc[slack_ts] = dc_msg_id
+                    self.map_dc_to_slack[dc_msg_id] = slack_ts
+                    await store_functions.set_dc_id_for_slack(slack_ts, int(dc_msg_id))
+
+            if self.forward_to_telegram:
+                tg_msg_id = await self.forward_to_telegram(msg_tg, reply_to_telegram_message_id=reply_to_tg_id, files=files, internal_id=internal_id)
+                if tg_msg_id:
+                    self.map_slack_to_tg[slack_ts] = tg_msg_id
+                    self.map_tg_to_slack[tg_msg_id] = slack_ts
+                    await store_functions.set_tg_id_for_slack(slack_ts, int(tg_msg_id))
+
+    async def process_edit(self, event):
+        if not self.edit_relay or event.get("channel") != self.channel_id:
+            return
+        message = event.get("message", {})
+        if message.get("user") == self.bot_user_id or message.get("bot_id"):
+            return
+        text = message.get("text", "")
+        # Unfurls and thread updates also arrive as message_changed with the text untouched
+        if text == event.get("previous_message", {}).get("text"):
+            return
+        if isdd(text) or istg(text):
+            return
+        await self.edit_relay.edited("slack", message.get("ts"), text)
+
+    async def process_delete(self, event):
+        if not self.edit_relay or event.get("channel") != self.channel_id:
+            return
+        await self.edit_relay.deleted("slack", event.get("deleted_ts"))
+
+    async def process_reaction(self, event):
+        item = event.get("item", {})
+        if not self.reactions or item.get("type") != "message" or item.get("channel") != self.channel_id:
+            return
+        if event.get("user") == self.bot_user_id:
+            return
+        emoji = slack_emoji(event.get("reaction", ""))
+        if event.get("type") == "reaction_added":
+            self.reactions.added("slack", item.get("ts"), emoji)
+        else:
+            self.reactions.removed("slack", item.get("ts"), emoji)
 
     async def get_username(self, user_id):
         try:
@@ -103,7 +172,7 @@ class SlackBot:
                 user = response["user"]
                 return user.get("real_name") or user.get("name", "Unknown")
         except Exception as e:
-            print(f"Error fetching user info: {e}")
+            logger.error("Error fetching Slack user info for %s: %s", user_id, e)
         return "Unknown"
 
     async def handle_socket_mode_request(self, client: SocketModeClient, req: SocketModeRequest):
@@ -114,9 +183,12 @@ class SlackBot:
 
             # Process the event
             event = req.payload.get("event", {})
-            await self.process_message(event)
+            if event.get("type") in ("reaction_added", "reaction_removed"):
+                await self.process_reaction(event)
+            else:
+                await self.process_message(event)
 
-    async def send_message(self, text, reply_to_slack_ts=None):
+    async def send_message(self, text, reply_to_slack_ts=None, files=None):
         try:
             kwargs = {
                 "channel": self.channel_id,
@@ -129,11 +201,54 @@ class SlackBot:
             response = await self.client.chat_postMessage(**kwargs)
 
             if response["ok"]:
+                if files and not await self.upload_files(files, thread_ts=reply_to_slack_ts):
+                    # Take the text back so the outbox retry sends text and files together, not the text twice
+                    await self.delete_message(response["ts"])
+                    return None
                 return response["ts"]
         except Exception as e:
-            print(f"Error sending Slack message: {e}")
+            logger.error("Error sending Slack message: %s", e)
         return None
 
+    async def upload_files(self, files, thread_ts=None):
+        """Upload spooled files to the channel; returns False if the upload failed."""
+        try:
+            kwargs = {
+                "channel": self.channel_id,
+                "file_uploads": [{"file": f.path, "filename": f.name} for f in files],
+            }
+            if thread_ts:
+                kwargs["thread_ts"] = thread_ts
+            await self.client.files_upload_v2(**kwargs)
+            return True
+        except Exception as e:
+            logger.error("Error uploading files to Slack: %s", e)
+            return False
+
+    def file_attachments(self, event):
+        headers = {"Authorization": f"Bearer {self.bot_token}"}
+        return [
+            media.Attachment(
+                f.get("name"), f.get("size"), f.get("mimetype"),
+                lambda url=f.get("url_private_download"): media.http_chunks(url, headers=headers),
+                key=f"sk:{f['id']}" if f.get("id") else None,
+            )
+            for f in event.get("files", [])
+            if f.get("url_private_download")
+        ]
+
+    async def edit_message(self, slack_ts, text):
+        try:
+            await self.client.chat_update(channel=self.channel_id, ts=slack_ts, text=text)
+        except Exception as e:
+            logger.error("Error editing Slack message %s: %s", slack_ts, e)
+
+    async def delete_message(self, slack_ts):
+        try:
+            await self.client.chat_delete(channel=self.channel_id, ts=slack_ts)
+        except Exception as e:
+            logger.error("Error deleting Slack message %s: %s", slack_ts, e)
+
     async def create_client(self):
         self.client = AsyncWebClient(token=self.bot_token)
 
@@ -141,9 +256,9 @@ class SlackBot:
             auth_response = await self.client.auth_test()
             if auth_response["ok"]:
                 self.bot_user_id = auth_response["user_id"]
-                print(f"Slack bot user ID: {self.bot_user_id}")
+                logger.info("Slack bot user ID: %s", self.bot_user_id)
         except Exception as e:
-            print(f"Error getting bot user ID: {e}")
+            logger.error("Error getting Slack bot user ID: %s", e)
 
         self.socket_client = SocketModeClient(
             app_token=self.app_token,
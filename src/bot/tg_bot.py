@@ -1,6 +1,8 @@
-from telethon import TelegramClient, events
+from telethon import TelegramClient, events, utils
+from telethon.tl import types
 from src.utils.bridge import isdd, isslack, tgformat
 from src.database import store_functions
+from src.utils import media
 
 
 class TelegramBot:
@@ -17,6 +19,14 @@ class TelegramBot:
         self.map_dc_to_tg = {}
         self.map_tg_to_slack = {}
         self.map_slack_to_tg = {}
+        self.edit_relay = None
+        self.reactions = None
+
+    def set_edit_relay(self, edit_relay):
+        self.edit_relay = edit_relay
+
+    def set_reaction_aggregator(self, reactions):
+        self.reactions = reactions
 
     def set_forward_callbacks(self, discord_callback=None, slack_callback=None):
         self.forward_to_discord = discord_callback
@@ -28,31 +38,51 @@ class TelegramBot:
         self.map_tg_to_slack = tg_to_slack
         self.map_slack_to_tg = slack_to_tg
 
+    def file_attachments(self, message):
+        f = message.file
+        if not f:
+            return []
+        name = f.name or f"telegram_{message.id}{f.ext or ''}"
+        return [media.Attachment(
+            name, f.size, f.mime_type,
+            lambda: self.client.iter_download(message.media, request_size=media.CHUNK_SIZE),
+            key=f"tg:{f.media.id}" if getattr(f.media, "id", None) else None,
+        )]
+
     async def handle_message(self, event):
-        if not event.message or not event.message.text:
+        if not event.message:
             return
 
         # Check if message is from the correct chat
         if event.chat_id != self.chat_id:
             return
 
-        if isdd(event.message.text) or isslack(event.message.text):
+        await self.relay_message(event.message)
+
+    async def relay_message(self, message):
+        """Store and forward one chat message; shared by the live handler and startup backfill."""
+        if not (message.text or message.file):
+            return
+
+        text = message.text or ""
+        if isdd(text) or isslack(text):
             return
+        attachments = self.file_attachments(message)
 
-        sender = await event.get_sender()
+        sender = await message.get_sender()
         username = sender.first_name if hasattr(sender, 'first_name') else 'Unknown'
         if hasattr(sender, 'last_name') and sender.last_name:
             username += f" {sender.last_name}"
 
-        msg = tgformat(username, event.message.text)
+        msg = tgformat(username, text)
 
         reply_to_discord_message_id = None
         reply_to_slack_ts = None
         reply_to_internal_id = None
         reply_to_tg_id = None
 
-        if event.message.reply_to_msg_id:
-            replied_tg_id = event.message.reply_to_msg_id
+        if message.reply_to_msg_id:
+            replied_tg_id = message.reply_to_msg_id
             reply_to_tg_id = replied_tg_id
             reply_to_discord_message_id = self.map_tg_to_dc.get(replied_tg_id)
             reply_to_slack_ts = self.map_tg_to_slack.get(replied_tg_id)
@@ -62,46 +92,127 @@ class TelegramBot:
             except Exception:
                 reply_to_internal_id = None
 
-        tg_msg_id = event.message.id
-        await store_functions.add_message(
+        tg_msg_id = message.id
+        internal_id = await store_functions.add_message(
             source='telegram',
-            text=event.message.text,
+            text=text,
             username=username,
             tg_msg_id=tg_msg_id,
             reply_to_tg_id=reply_to_tg_id,
             reply_to_dc_id=reply_to_discord_message_id,
             reply_to_slack_ts=reply_to_slack_ts,
             reply_to_id=reply_to_internal_id,
+            # The message's own time, so one replayed by backfill sorts where it was sent
+            timestamp=message.date.timestamp() if message.date else None,
+            attachments=[a.describe() for a in attachments] or None,
         )
+        if internal_id is None:
+            # Already stored, and relayed, by the live handler or startup backfill
+            return
+
+        async with media.relay(attachments) as (files, skipped):
+            msg += media.skipped_note(skipped)
+
+            if self.forward_to_discord:
+                dc_msg_id = await self.forward_to_discord(msg, reply_to_discord_message_id=reply_to_discord_message_id, files=files, internal_id=internal_id)
+                if dc_msg_id:
+                    self.map_tg_to_dc[tg_msg_id] = dc_msg_id
+                    self.map_dc_to_tg[dc_msg_id] = tg_msg_id
+                    await store_functions.set_dc_id_for_tg(tg_msg_id, int(dc_msg_id))
+
+            if self.forward_to_slack:
+                slack_ts = await self.forward_to_slack(msg, reply_to_slack_ts=reply_to_slack_ts, files=files, internal_id=internal_id)
+                if slack_ts:
+                    self.map_tg_to_slack[tg_msg_id] = slack_ts
+                    self.map_slack_to_tg[slack_ts] = tg_msg_id
+                    await store_functions.set_slack_ts_for_tg(tg_msg_id, slack_ts)
+
+    async def handle_edit(self, event):
+        if not self.edit_relay or not event.message or event.chat_id != self.chat_id:
+            return
+        text = event.message.text or ""
+        if isdd(text) or isslack(text):
+            return
+        if event.out:
+            # In user-account mode the bridge's own copies (e.g. of API messages) are outgoing, and so are its edits
+            m = await store_functions.find_by_tg_id(event.message.id)
+            if not m or m.get("source") != "telegram":
+                return
+        await self.edit_relay.edited("telegram", event.message.id, text)
+
+    def is_basic_group(self):
+        return utils.resolve_id(self.chat_id)[1] is types.PeerChat
+
+    async def handle_delete(self, event):
+        if not self.edit_relay:
+            return
+        if event.chat_id is None:
+            # Deletions without a chat id come from private chats and basic groups, which share one id sequence;
+            # supergroups and channels number their own messages, so such an id says nothing about them
+            if not self.is_basic_group():
+                return
+        elif event.chat_id != self.chat_id:
+            return
+        for tg_msg_id in event.deleted_ids:
+            await self.edit_relay.deleted("telegram", tg_msg_id)
 
-        if self.forward_to_discord:
-            dc_msg_id = await self.forward_to_discord(msg, reply_to_discord_message_id=reply_to_discord_message_id)
-            if dc_msg_id:
-                self.map_tg_to_dc[tg_msg_id] = dc_msg_id
-                self.map_dc_to_tg[dc_msg_id] = tg_msg_id
-                await store_functions.set_dc_id_for_tg(tg_msg_id, int(dc_msg_id))
+    def in_chat(self, peer):
+        return utils.get_peer_id(peer) == self.chat_id
 
-        if self.forward_to_slack:
-            slack_ts = await self.forward_to_slack(msg, reply_to_slack_ts=reply_to_slack_ts)
-            if slack_ts:
-                self.map_tg_to_slack[tg_msg_id] = slack_ts
-                self.map_slack_to_tg[slack_ts] = tg_msg_id
-                await store_functions.set_slack_ts_for_tg(tg_msg_id, slack_ts)
+    async def handle_reaction_counts(self, update):
+        # User accounts get the full per-message counts
+        if not self.reactions or not self.in_chat(update.peer):
+            return
+        counts = {}
+        for result in getattr(update.reactions, "results", None) or []:
+            if isinstance(result.reaction, types.ReactionEmoji):
+                counts[result.reaction.emoticon] = result.count
+        self.reactions.counted("telegram", update.msg_id, counts)
+
+    async def handle_reaction_change(self, update):
+        # Bot accounts get one user's old and new reactions
+        if not self.reactions or not self.in_chat(update.peer):
+            return
+        for reaction in update.old_reactions:
+            if isinstance(reaction, types.ReactionEmoji):
+                self.reactions.removed("telegram", update.msg_id, reaction.emoticon)
+        for reaction in update.new_reactions:
+            if isinstance(reaction, types.ReactionEmoji):
+                self.reactions.added("telegram", update.msg_id, reaction.emoticon)
 
     async def start(self):
         """Start the Telegram client"""
         if self.bot_token:
             self.client = TelegramClient('bot_session', self.api_id, self.api_hash)
-            await self.client.start(bot_token=self.bot_token)
         else:
             self.client = TelegramClient('user_session', self.api_id, self.api_hash)
-            await self.client.start(phone=self.phone)
 
-        # Register event handler for new messages
+        # Registered before connecting, so a client whose first start fails never runs without them
         @self.client.on(events.NewMessage(chats=self.chat_id))
         async def message_handler(event):
             await self.handle_message(event)
 
+        @self.client.on(events.MessageEdited(chats=self.chat_id))
+        async def edit_handler(event):
+            await self.handle_edit(event)
+
+        @self.client.on(events.MessageDeleted())
+        async def delete_handler(event):
+            await self.handle_delete(event)
+
+        @self.client.on(events.Raw(types.UpdateMessageReactions))
+        async def reaction_counts_handler(update):
+            await self.handle_reaction_counts(update)
+
+        if hasattr(types, "UpdateBotMessageReaction"):
+            @self.client.on(events.Raw(types.UpdateBotMessageReaction))
+            async def reaction_change_handler(update):
+                await self.handle_reaction_change(update)
+
+        if self.bot_token:
+            await self.client.start(bot_token=self.bot_token)
+        else:
+            await self.client.start(phone=self.phone)
         return self.client
 
     def get_client(self):
@@ -17,10 +17,51 @@ def load_config():
     slack_bot_token = os.getenv("SLACK_BOT_TOKEN", "")
     slack_app_token = os.getenv("SLACK_APP_TOKEN", "")
     slack_channel = os.getenv("SLACK_CHANNEL_ID", "")
+    storage_backend = os.getenv("STORAGE_BACKEND", "mongo").lower()
+    sqlite_path = os.getenv("SQLITE_PATH", "bindsync.db")
     mongo_uri = os.getenv("MONGO_URI", "")
     mongo_db = os.getenv("MONGO_DB", "")
+    mongo_options = {
+        "max_pool_size": int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+        "min_pool_size": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+        "max_idle_time_ms": int(os.getenv("MONGO_MAX_IDLE_TIME_MS")) if os.getenv("MONGO_MAX_IDLE_TIME_MS") else None,
+        "server_selection_timeout_ms": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "30000")),
+        "connect_timeout_ms": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "20000")),
+        "socket_timeout_ms": int(os.getenv("MONGO_SOCKET_TIMEOUT_MS")) if os.getenv("MONGO_SOCKET_TIMEOUT_MS") else None,
+        "compressors": os.getenv("MONGO_COMPRESSORS") or None,
+        "history_read_preference": os.getenv("MONGO_HISTORY_READ_PREFERENCE", "primary"),
+    }
     api_host = os.getenv("API_HOST", "localhost")
     api_port = int(os.getenv("API_PORT", "000"))
+    admin_session_ttl_hours = float(os.getenv("ADMIN_SESSION_TTL_HOURS", "12"))
+    api_token_secret = os.getenv("API_TOKEN_SECRET", "")
+    rate_limit_requests = int(os.getenv("RATE_LIMIT_REQUESTS_PER_MINUTE", "120"))
+    rate_limit_messages = int(os.getenv("RATE_LIMIT_MESSAGES_PER_MINUTE", "30"))
+    retention_days = float(os.getenv("MESSAGE_RETENTION_DAYS", "0"))
+    archive_enabled = os.getenv("MESSAGE_ARCHIVE", "true").lower() in ("1", "true", "yes")
+    retention_interval = int(os.getenv("RETENTION_INTERVAL_SECONDS", "3600"))
+    media_relay = os.getenv("MEDIA_RELAY", "true").lower() in ("1", "true", "yes")
+    media_max_bytes = int(float(os.getenv("MEDIA_MAX_MB", "25")) * 1024 * 1024)
+    media_max_transfers = int(os.getenv("MEDIA_MAX_TRANSFERS", "3"))
+    media_temp_dir = os.getenv("MEDIA_TEMP_DIR") or None
+    media_cache_dir = os.getenv("MEDIA_CACHE_DIR", "media_cache")
+    media_cache_max_bytes = int(float(os.getenv("MEDIA_CACHE_MB", "500")) * 1024 * 1024)
+    outbox_base_delay = float(os.getenv("OUTBOX_BASE_DELAY_SECONDS", "5"))
+    outbox_max_delay = float(os.getenv("OUTBOX_MAX_DELAY_SECONDS", "3600"))
+    outbox_max_attempts = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+    outbox_spool_dir = os.getenv("OUTBOX_SPOOL_DIR", "outbox_files")
+    circuit_failure_threshold = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    circuit_reset = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+    send_timeout = float(os.getenv("SEND_TIMEOUT_SECONDS", "15"))
+    backfill_enabled = os.getenv("BACKFILL", "true").lower() in ("1", "true", "yes")
+    backfill_max = int(os.getenv("BACKFILL_MAX_MESSAGES", "500"))
+    backfill_delay = float(os.getenv("BACKFILL_DELAY_SECONDS", "0.5"))
+    edit_debounce = float(os.getenv("EDIT_DEBOUNCE_SECONDS", "2"))
+    reaction_window = float(os.getenv("REACTION_WINDOW_SECONDS", "5"))
+    health_cache_seconds = float(os.getenv("HEALTH_CACHE_SECONDS", "5"))
+    shutdown_timeout = float(os.getenv("SHUTDOWN_TIMEOUT_SECONDS", "25"))
+    log_level = os.getenv("LOG_LEVEL", "INFO").upper()
+    log_file = os.getenv("LOG_FILE", "bridge.log")
 
 
     missing = []
@@ -42,9 +83,19 @@ def load_config():
         missing.append("SLACK_APP_TOKEN")
     if not slack_channel:
         missing.append("SLACK_CHANNEL_ID")
-    if not mongo_uri:
+    if storage_backend not in ("mongo", "sqlite"):
+        raise ValueError(f"Unknown STORAGE_BACKEND: {storage_backend}")
+    if rate_limit_requests < 0:
+        raise ValueError("RATE_LIMIT_REQUESTS_PER_MINUTE must be 0 (unlimited) or more")
+    if rate_limit_messages != 0 and rate_limit_messages < 3:
+        # A message to all three platforms costs 3, so a lower quota could never send one
+        raise ValueError("RATE_LIMIT_MESSAGES_PER_MINUTE must be 0 (unlimited) or at least 3")
+    if len(api_token_secret.encode()) > 64:
+        # BLAKE2b keys are limited to 64 bytes
+        raise ValueError("API_TOKEN_SECRET must be at most 64 bytes")
+    if storage_backend == "mongo" and not mongo_uri:
         missing.append("MONGO_URI")
-    if not mongo_db:
+    if storage_backend == "mongo" and not mongo_db:
         missing.append("MONGO_DB")
     if missing:
         raise ValueError("Missing environment variables: " + ", ".join(missing))
@@ -60,8 +111,40 @@ def load_config():
         "slack_bot_token": slack_bot_token,
         "slack_app_token": slack_app_token,
         "slack_channel_id": slack_channel,
+        "storage_backend": storage_backend,
+        "sqlite_path": sqlite_path,
         "mongo_uri": mongo_uri,
         "mongo_db": mongo_db,
+        "mongo_options": mongo_options,
         "api_host": api_host,
         "api_port": api_port,
+        "admin_session_ttl_hours": admin_session_ttl_hours,
+        "api_token_secret": api_token_secret,
+        "rate_limit_requests_per_minute": rate_limit_requests,
+        "rate_limit_messages_per_minute": rate_limit_messages,
+        "message_retention_days": retention_days,
+        "message_archive": archive_enabled,
+        "retention_interval_seconds": retention_interval,
+        "media_relay": media_relay,
+        "media_max_bytes": media_max_bytes,
+        "media_max_transfers": media_max_transfers,
+        "media_temp_dir": media_temp_dir,
+        "media_cache_dir": media_cache_dir,
+        "media_cache_max_bytes": media_cache_max_bytes,
+        "outbox_base_delay_seconds": outbox_base_delay,
+        "outbox_max_delay_seconds": outbox_max_delay,
+        "outbox_max_attempts": outbox_max_attempts,
+        "outbox_spool_dir": outbox_spool_dir,
+        "circuit_failure_threshold": circuit_failure_threshold,
+        "circuit_reset_seconds": circuit_reset,
+        "send_timeout_seconds": send_timeout,
+        "backfill_enabled": backfill_enabled,
+        "backfill_max_messages": backfill_max,
+        "backfill_delay_seconds": backfill_delay,
+        "edit_debounce_seconds": edit_debounce,
+        "reaction_window_seconds": reaction_window,
+        "health_cache_seconds": health_cache_seconds,
+        "shutdown_timeout_seconds": shutdown_timeout,
+        "log_level": log_level,
+        "log_file": log_file,
     }
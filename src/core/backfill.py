@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import discord
+from src.database import store_functions
+
+logger = logging.getLogger(__name__)
+
+ENABLED = True
+MAX_MESSAGES = 500
+# Pause between replayed messages, on top of the outbox's own circuit breakers
+DELAY_SECONDS = 0.5
+SLACK_PAGE_SIZE = 200
+
+
+def configure(enabled=None, max_messages=None, delay_seconds=None):
+    global ENABLED, MAX_MESSAGES, DELAY_SECONDS
+    if enabled is not None:
+        ENABLED = enabled
+    if max_messages:
+        MAX_MESSAGES = max_messages
+    if delay_seconds is not None:
+        DELAY_SECONDS = delay_seconds
+
+
+async def watermarks():
+    """Last persisted id per platform; read before the live handlers start storing new messages."""
+    return {
+        "telegram": await store_functions.last_platform_id("tg_msg_id"),
+        "discord": await store_functions.last_platform_id("dc_msg_id"),
+        "slack": await store_functions.last_platform_id("slack_ts"),
+    }
+
+
+async def _replay(platform, messages, seen, relay):
+    """Relay messages oldest first, skipping any that are already stored (the live handler may have got there).
+
+    `seen` is only a cheap pre-check: the unique platform-id indexes make storing the message the real claim, so one
+    arriving live while it is replayed is still relayed once.
+    """
+    if len(messages) >= MAX_MESSAGES:
+        logger.warning("Backfill of %s hit BACKFILL_MAX_MESSAGES; only the newest %s are replayed", platform, MAX_MESSAGES)
+    count = 0
+    for message_id, message in messages:
+        if await seen(message_id):
+            continue
+        try:
+            await relay(message)
+            count += 1
+        except Exception as e:
+            logger.error("Backfill of %s message %s failed: %s", platform, message_id, e)
+        await asyncio.sleep(DELAY_SECONDS)
+    return count
+
+
+async def backfill_telegram(tg_bot, last_id):
+    if tg_bot.bot_token:
+        # The Bot API forbids reading chat history (messages.getHistory), so only a user session can catch up
+        logger.info("Skipping Telegram backfill: history can't be read with a bot token")
+        return 0
+    client = tg_bot.get_client()
+    # iter_messages pages through history newest first, in batches of 100
+    messages = [(m.id, m) async for m in client.iter_messages(tg_bot.chat_id, min_id=last_id, limit=MAX_MESSAGES)]
+    messages.reverse()
+    return await _replay("telegram", messages, store_functions.find_by_tg_id, tg_bot.relay_message)
+
+
+async def backfill_discord(dc_bot, last_id):
+    client = dc_bot.get_client()
+    await client.wait_until_ready()
+    channel = client.get_channel(dc_bot.channel_id)
+    if not channel:
+        return 0
+    # Newest first, like the other platforms, so a long outage keeps the most recent messages
+    history = channel.history(after=discord.Object(id=last_id), oldest_first=False, limit=MAX_MESSAGES)
+    messages = [(m.id, m) async for m in history]
+    messages.reverse()
+    return await _replay("discord", messages, store_functions.find_by_dc_id, dc_bot.on_message)
+
+
+async def backfill_slack(slack_bot, last_ts):
+    messages = []
+    cursor = None
+    while len(messages) < MAX_MESSAGES:
+        kwargs = {"channel": slack_bot.channel_id, "oldest": last_ts, "limit": SLACK_PAGE_SIZE}
+        if cursor:
+            kwargs["cursor"] = cursor
+        response = await slack_bot.client.conversations_history(**kwargs)
+        for event in response.get("messages", []):
+            messages.append((event["ts"], {**event, "type": "message", "channel": slack_bot.channel_id}))
+        cursor = (response.get("response_metadata") or {}).get("next_cursor")
+        if not response.get("has_more") or not cursor:
+            break
+    # conversations.history returns newest first
+    messages.sort(key=lambda item: float(item[0]))
+    return await _replay("slack", messages[-MAX_MESSAGES:], store_functions.find_by_slack_ts, slack_bot.relay_message)
+
+
+async def run(marks, tg_bot, dc_bot, slack_bot, ready=None):
+    """Catch up on each platform's history since its watermark; platforms without one are skipped.
+
+    At most MAX_MESSAGES per platform are replayed, the newest ones.
+
+    With `ready` (platform -> asyncio.Event), each platform is caught up as soon as its client is up,
+    alongside the others.
+    """
+    if not ENABLED:
+        return
+    jobs = [
+        ("telegram", backfill_telegram, tg_bot),
+        ("discord", backfill_discord, dc_bot),
+        ("slack", backfill_slack, slack_bot),
+    ]
+
+    async def catch_up(platform, job, bot):
+        if marks.get(platform) is None:
+            return
+        if ready:
+            await ready[platform].wait()
+        try:
+            count = await job(bot, marks[platform])
+            if count:
+                logger.info("Backfilled %s missed %s messages", count, platform)
+        except Exception as e:
+            logger.error("Backfill of %s failed: %s", platform, e)
+
+    await asyncio.gather(*(catch_up(*job) for job in jobs))
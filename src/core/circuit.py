@@ -0,0 +1,65 @@
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Per-target breaker: after `failure_threshold` consecutive failures, calls are refused for `reset_timeout`
+    seconds, then a single probe decides whether to close again."""
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0, call_timeout=15.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.call_timeout = call_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.stats = {"successes": 0, "failures": 0, "timeouts": 0, "rejected": 0, "opened": 0}
+
+    def allow(self):
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.time() - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self.probing:
+            self.probing = True
+            return True
+        self.stats["rejected"] += 1
+        return False
+
+    def retry_at(self):
+        return self.opened_at + self.reset_timeout if self.state != CLOSED else time.time()
+
+    def release(self):
+        """End a call let through by `allow()` that produced no success or failure, so the next call can probe."""
+        self.probing = False
+
+    def record_success(self):
+        self.stats["successes"] += 1
+        self.state = CLOSED
+        self.failures = 0
+        self.probing = False
+
+    def record_failure(self, timeout=False):
+        self.stats["failures"] += 1
+        if timeout:
+            self.stats["timeouts"] += 1
+        self.failures += 1
+        self.probing = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.stats["opened"] += 1
+            self.state = OPEN
+            self.opened_at = time.time()
+
+    def snapshot(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "retry_at": self.retry_at() if self.state != CLOSED else None,
+            **self.stats,
+        }
@@ -0,0 +1,118 @@
+import logging
+from collections import OrderedDict
+from src.database import store_functions
+from src.utils.bridge import tgformat, ddformat, skformat
+from src.utils.debounce import Debouncer
+
+logger = logging.getLogger(__name__)
+
+EDIT_DEBOUNCE_SECONDS = 2.0
+
+# Lookup of a stored message by a platform's message id (its own or a mirrored copy)
+SOURCES = {
+    "telegram": store_functions.find_by_tg_id,
+    "discord": store_functions.find_by_dc_id,
+    "slack": store_functions.find_by_slack_ts,
+}
+# How a message from each source is rendered on the other platforms
+FORMATS = {
+    "telegram": tgformat,
+    "discord": ddformat,
+    "slack": skformat,
+    "api": lambda username, text: f"[API] {username}: {text}",
+    "api_reply": lambda username, text: f"[API] {username}: {text}",
+}
+MAX_SUMMARY_REACTIONS = 10
+# Field holding each platform's copy of a message
+LINK_FIELDS = {
+    "telegram": "tg_msg_id",
+    "discord": "dc_msg_id",
+    "slack": "slack_ts",
+}
+# Mirrored copies whose last rendered text is remembered, to skip edits that wouldn't change anything
+MAX_RENDERED = 4096
+
+
+class EditRelay:
+    """Mirror edits and deletions onto the linked copies on the other platforms."""
+
+    def __init__(self, delay=EDIT_DEBOUNCE_SECONDS):
+        self.delay = delay
+        self.targets = {}
+        self.debouncers = {}
+        # (platform, copy id) -> text last written to that copy
+        self.rendered = OrderedDict()
+
+    def set_target(self, platform, edit, delete, min_interval=0.0):
+        """`edit(message_id, text)` and `delete(message_id)` act on `platform`'s copy of a message."""
+        self.targets[platform] = (edit, delete)
+        self.debouncers[platform] = Debouncer(self.delay, min_interval)
+
+    def render(self, m, platform):
+        """The mirrored text of `m` on `platform`, with reactions made on the other platforms appended."""
+        fmt = FORMATS.get(m.get("source"), FORMATS["api"])
+        text = fmt(m.get("username") or "Unknown", m.get("text") or "")
+        totals = {}
+        for source, counts in (m.get("reactions") or {}).items():
+            if source == platform:
+                continue
+            for emoji, count in counts.items():
+                totals[emoji] = totals.get(emoji, 0) + count
+        summary = sorted(((e, c) for e, c in totals.items() if c > 0), key=lambda item: -item[1])
+        if summary:
+            text += "\n" + "  ".join(f"{e} {c}" for e, c in summary[:MAX_SUMMARY_REACTIONS])
+        return text
+
+    def remember(self, platform, target_id, text):
+        key = (platform, target_id)
+        self.rendered[key] = text
+        self.rendered.move_to_end(key)
+        while len(self.rendered) > MAX_RENDERED:
+            self.rendered.popitem(last=False)
+
+    def refresh(self, m, changed_sources=None):
+        """Re-render every mirrored copy of `m`; the author's original can't be edited by the bridge.
+
+        With `changed_sources` (platforms whose reactions changed), copies whose text can't have changed are skipped:
+        a platform's copy leaves out that platform's own reactions.
+        """
+        for platform, (edit, _) in self.targets.items():
+            target_id = m.get(LINK_FIELDS[platform])
+            if platform == m.get("source") or target_id is None:
+                continue
+            if changed_sources is not None and set(changed_sources) <= {platform}:
+                continue
+            mirrored = self.render(m, platform)
+            if self.rendered.get((platform, target_id)) == mirrored:
+                continue
+
+            async def apply(platform=platform, edit=edit, target_id=target_id, text=mirrored):
+                await edit(target_id, text)
+                self.remember(platform, target_id, text)
+
+            self.debouncers[platform].schedule(target_id, apply)
+
+    async def edited(self, source, message_id, text):
+        m = await SOURCES[source](message_id)
+        if not m or m.get("text") == text:
+            return
+        await store_functions.set_text(m["id"], text)
+        m["text"] = text
+        self.refresh(m)
+
+    async def deleted(self, source, message_id):
+        m = await SOURCES[source](message_id)
+        if not m:
+            return
+        await store_functions.delete_message(m["id"])
+        for platform, (_, delete) in self.targets.items():
+            target_id = m.get(LINK_FIELDS[platform])
+            if platform == m.get("source") or target_id is None:
+                continue
+            self.rendered.pop((platform, target_id), None)
+            # Replaces any edit still queued for the same copy
+            self.debouncers[platform].schedule(target_id, lambda delete=delete, target_id=target_id: delete(target_id))
+
+    async def flush(self):
+        for debouncer in self.debouncers.values():
+            await debouncer.flush()
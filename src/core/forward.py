@@ -1,34 +1,81 @@
 import logging
 import asyncio
+import contextlib
+import signal
 import uvicorn
 from src.bot.tg_bot import TelegramBot
 from src.bot.dc_bot import DiscordBot
 from src.bot.sk_bot import SlackBot
 from src.config import load_config
-from src.database import database, store_functions
+from src.database import database, store_functions, archive, migrate_schema
 from src.api.server import app, set_runtime
+from src.api import health_routes
+from src.auth import auth_manager, rate_limit, analytics
+from src.utils.logs import setup_logging, stop_logging
+from src.utils import media
 from src.utils.bridge import (
     fwd_dd_with_reply as util_forward_dc_reply,
     fwd_to_tg_rply as util_forward_tg_reply,
     fwd_to_slack as util_forward_slack,
+    edit_tg, delete_tg, edit_dd, delete_dd, edit_slack, delete_slack,
 )
+from src.core.edits import EditRelay
+from src.core.reactions import ReactionAggregator
+from src.core import outbox, backfill
+from src.core.supervisor import Supervisor, InFlight
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('bridge.log'),
-        logging.StreamHandler(),
-    ],
-)
 logger = logging.getLogger(__name__)
 
+SLACK_WATCHDOG_SECONDS = 30
+
+
+class ApiServer(uvicorn.Server):
+    """Leaves SIGINT/SIGTERM to the bridge, which stops the server as one step of its own shutdown."""
+
+    def install_signal_handlers(self):
+        pass
+
+    @contextlib.contextmanager
+    def capture_signals(self):
+        yield
+
+
 async def main():
     cfg = load_config()
+    setup_logging(cfg["log_level"], cfg["log_file"])
 
-    await database.init_db(cfg["mongo_uri"], cfg["mongo_db"])
-    await store_functions.configure()
-    logger.info("Connected to MongoDB")
+    archive.configure(
+        retention_days=cfg["message_retention_days"],
+        archive_enabled=cfg["message_archive"],
+        interval_seconds=cfg["retention_interval_seconds"],
+    )
+    rate_limit.configure(
+        requests_per_minute=cfg["rate_limit_requests_per_minute"],
+        messages_per_minute=cfg["rate_limit_messages_per_minute"],
+    )
+    outbox.configure(
+        base_delay=cfg["outbox_base_delay_seconds"],
+        max_delay=cfg["outbox_max_delay_seconds"],
+        max_attempts=cfg["outbox_max_attempts"],
+        failure_threshold=cfg["circuit_failure_threshold"],
+        reset_timeout=cfg["circuit_reset_seconds"],
+        send_timeout=cfg["send_timeout_seconds"],
+        spool_dir=cfg["outbox_spool_dir"],
+    )
+    media.configure(
+        enabled=cfg["media_relay"],
+        max_bytes=cfg["media_max_bytes"],
+        max_transfers=cfg["media_max_transfers"],
+        temp_dir=cfg["media_temp_dir"],
+        cache_dir=cfg["media_cache_dir"],
+        cache_max_bytes=cfg["media_cache_max_bytes"],
+    )
+    backfill.configure(
+        enabled=cfg["backfill_enabled"],
+        max_messages=cfg["backfill_max_messages"],
+        delay_seconds=cfg["backfill_delay_seconds"],
+    )
+    health_routes.configure(cache_seconds=cfg["health_cache_seconds"])
 
     map_tg_to_dc = {}
     map_dc_to_tg = {}
@@ -51,32 +98,53 @@ async def main():
         app_token=cfg["slack_app_token"]
     )
 
-    tg_client = await tg_bot.start()
-    dbot = dc_bot.create_client()
-    slack_client = await slack_bot.create_client()
-
-    async def fwd_to_dd(message, reply_to_discord_message_id=None):
-        return await util_forward_dc_reply(
-            dbot,
-            cfg["discord_channel_id"],
-            message,
-            message_id=reply_to_discord_message_id,
-        )
-
-    async def forward_to_telegram(message, reply_to_telegram_message_id=None):
-        return await util_forward_tg_reply(
-            tg_client,
-            cfg["telegram_chat_id"],
-            message,
-            msg_id=reply_to_telegram_message_id,
-        )
-
-    async def forward_to_slack(message, reply_to_slack_ts=None):
-        return await util_forward_slack(
-            slack_bot,
-            message,
-            slack_ts=reply_to_slack_ts,
-        )
+    # Set while each platform's client is up and cleared when it drops; deliveries to a platform wait for it
+    # (within the send timeout)
+    ready = {"telegram": asyncio.Event(), "discord": asyncio.Event(), "slack": asyncio.Event()}
+
+    dc_on_ready = dc_bot.on_ready
+
+    async def on_ready():
+        await dc_on_ready()
+        ready["discord"].set()
+
+    dc_bot.on_ready = on_ready
+
+    # Wrapped before the clients register them, so shutdown can wait for relays already under way
+    inflight = InFlight()
+    inflight.guard(tg_bot, "relay_message")
+    inflight.guard(tg_bot, "handle_edit", "handle_delete", "handle_reaction_counts", "handle_reaction_change",
+                   during_drain=True)
+    inflight.guard(dc_bot, "on_message")
+    inflight.guard(dc_bot, "on_raw_message_edit", "on_raw_message_delete", "on_raw_reaction_add",
+                   "on_raw_reaction_remove", during_drain=True)
+    inflight.guard(slack_bot, "relay_message")
+    inflight.guard(slack_bot, "process_edit", "process_delete", "process_reaction", during_drain=True)
+
+    dc_bot.create_client()
+
+    def when_ready(target, send):
+        async def send_when_ready(message, reply_to, files):
+            await ready[target].wait()
+            return await send(message, reply_to, files)
+        return send_when_ready
+
+    # Every delivery goes through the outbox, so a failed send is retried instead of lost
+    outbox.register_sender("discord", when_ready("discord", lambda message, reply_to, files: util_forward_dc_reply(
+        dc_bot.get_client(), cfg["discord_channel_id"], message, message_id=reply_to, files=files)))
+    outbox.register_sender("telegram", when_ready("telegram", lambda message, reply_to, files: util_forward_tg_reply(
+        tg_bot.get_client(), cfg["telegram_chat_id"], message, msg_id=reply_to, files=files)))
+    outbox.register_sender("slack", when_ready("slack", lambda message, reply_to, files: util_forward_slack(
+        slack_bot, message, slack_ts=reply_to, files=files)))
+
+    async def fwd_to_dd(message, reply_to_discord_message_id=None, files=None, internal_id=None):
+        return await outbox.deliver("discord", message, reply_to=reply_to_discord_message_id, files=files, internal_id=internal_id)
+
+    async def forward_to_telegram(message, reply_to_telegram_message_id=None, files=None, internal_id=None):
+        return await outbox.deliver("telegram", message, reply_to=reply_to_telegram_message_id, files=files, internal_id=internal_id)
+
+    async def forward_to_slack(message, reply_to_slack_ts=None, files=None, internal_id=None):
+        return await outbox.deliver("slack", message, reply_to=reply_to_slack_ts, files=files, internal_id=internal_id)
 
     tg_bot.set_forward_callbacks(
         discord_callback=fwd_to_dd,
@@ -95,35 +163,212 @@ async def main():
         forward_to_telegram=forward_to_telegram
     )
     slack_bot.set_message_maps(map_slack_to_dc, map_slack_to_tg, map_dc_to_slack, map_tg_to_slack)
+    outbox.set_message_maps({
+        ("telegram", "discord"): map_tg_to_dc, ("discord", "telegram"): map_dc_to_tg,
+        ("telegram", "slack"): map_tg_to_slack, ("slack", "telegram"): map_slack_to_tg,
+        ("discord", "slack"): map_dc_to_slack, ("slack", "discord"): map_slack_to_dc,
+    })
 
-    set_runtime(tg_client, dbot, slack_bot, cfg, map_tg_to_dc, map_dc_to_tg, map_slack_to_dc, map_slack_to_tg, map_dc_to_slack, map_tg_to_slack)
+    # Spacing per target keeps an edit burst under each platform's per-chat write limits
+    edit_relay = EditRelay(delay=cfg["edit_debounce_seconds"])
+    edit_relay.set_target(
+        "telegram",
+        lambda msg_id, text: edit_tg(tg_bot.get_client(), cfg["telegram_chat_id"], msg_id, text),
+        lambda msg_id: delete_tg(tg_bot.get_client(), cfg["telegram_chat_id"], msg_id),
+        min_interval=1.0,
+    )
+    edit_relay.set_target(
+        "discord",
+        lambda msg_id, text: edit_dd(dc_bot.get_client(), cfg["discord_channel_id"], msg_id, text),
+        lambda msg_id: delete_dd(dc_bot.get_client(), cfg["discord_channel_id"], msg_id),
+        min_interval=1.0,
+    )
+    edit_relay.set_target(
+        "slack",
+        lambda ts, text: edit_slack(slack_bot, ts, text),
+        lambda ts: delete_slack(slack_bot, ts),
+        min_interval=1.2,
+    )
+    tg_bot.set_edit_relay(edit_relay)
+    dc_bot.set_edit_relay(edit_relay)
+    slack_bot.set_edit_relay(edit_relay)
 
-    config = uvicorn.Config(app, host=cfg["api_host"], port=cfg["api_port"], log_level="info")
-    server = uvicorn.Server(config)
-    api_task = asyncio.create_task(server.serve())
+    reactions = ReactionAggregator(edit_relay, window=cfg["reaction_window_seconds"])
+    tg_bot.set_reaction_aggregator(reactions)
+    dc_bot.set_reaction_aggregator(reactions)
+    slack_bot.set_reaction_aggregator(reactions)
 
-    logger.info("Telegram client started and listening...")
+    set_runtime(tg_bot, dc_bot, slack_bot, cfg, map_tg_to_dc, map_dc_to_tg, map_slack_to_dc, map_slack_to_tg, map_dc_to_slack, map_tg_to_slack)
 
-    logger.info("Starting Discord bot...")
-    discord_task = asyncio.create_task(dbot.start(cfg["discord_token"]))
+    # log_config=None lets uvicorn's loggers propagate into the queue handler instead of writing to stdout directly
+    config = uvicorn.Config(app, host=cfg["api_host"], port=cfg["api_port"], log_level="info", log_config=None,
+                            timeout_graceful_shutdown=cfg["shutdown_timeout_seconds"])
+    server = ApiServer(config)
 
-    logger.info("Starting Slack bot...")
-    try:
-        slack_task = asyncio.create_task(slack_client.connect())
-    except Exception as e:
-        logger.error(f"Failed to start Slack bot: {e}")
-        slack_task = None
+    async def run_telegram():
+        previous = tg_bot.get_client()
+        if previous is not None:
+            # Like Slack, each (re)start gets a new client rather than reusing one whose start may have failed
+            try:
+                await previous.disconnect()
+            except Exception as e:
+                logger.warning("Error closing the previous Telegram client: %s", e)
+        client = await tg_bot.start()
+        ready["telegram"].set()
+        logger.info("Telegram client started and listening...")
+        try:
+            await client.run_until_disconnected()
+        finally:
+            # Deliveries wait for the reconnect instead of failing against a dead client
+            ready["telegram"].clear()
+
+    async def run_discord():
+        client = dc_bot.get_client()
+        if client.is_closed():
+            # A closed discord.py client can't log in again
+            client = dc_bot.create_client()
+        try:
+            await client.start(cfg["discord_token"])
+        except Exception:
+            await client.close()
+            raise
+        finally:
+            ready["discord"].clear()
+
+    async def run_slack():
+        previous = slack_bot.get_client()
+        if previous is not None:
+            # A socket client that gave up stays down; each (re)start gets a new one
+            try:
+                await previous.close()
+            except Exception as e:
+                logger.warning("Error closing the previous Slack client: %s", e)
+        client = await slack_bot.create_client()
+        await client.connect()
+        ready["slack"].set()
+        # The socket client reconnects by itself; one that stays down across two checks is rebuilt
+        down = 0
+        try:
+            while True:
+                await asyncio.sleep(SLACK_WATCHDOG_SECONDS)
+                down = 0 if await client.is_connected() else down + 1
+                if down >= 2:
+                    raise ConnectionError("Slack socket mode connection lost")
+        finally:
+            ready["slack"].clear()
+
+    supervisor = Supervisor()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, supervisor.request_stop)
+        except NotImplementedError:
+            # Windows: Ctrl+C still ends the process, just without the drain
+            pass
+
+    health_routes.set_components(
+        tg_bot=tg_bot, dc_bot=dc_bot, slack_bot=slack_bot, supervisor=supervisor, inflight=inflight,
+        edit_relay=edit_relay, reactions=reactions,
+    )
 
-    logger.info("Running Telegram client...")
-    tg_task = asyncio.create_task(tg_client.run_until_disconnected())
+    failed = []
 
-    tasks = [api_task, discord_task, tg_task]
-    if slack_task:
-        tasks.append(slack_task)
+    async def open_storage():
+        try:
+            if cfg["storage_backend"] == "sqlite":
+                await database.init_sqlite(cfg["sqlite_path"])
+            else:
+                await database.init_db(cfg["mongo_uri"], cfg["mongo_db"], database.DatabaseOptions(**cfg["mongo_options"]))
+            await auth_manager.configure(session_ttl_hours=cfg["admin_session_ttl_hours"],
+                                         token_secret=cfg["api_token_secret"])
+            await migrate_schema.migrate_messages()
+            database.mark_ready()
+            logger.info("Connected to %s storage", cfg["storage_backend"])
+            # Taken before any live message is stored, so the gap since the last run is fully covered
+            marks = await backfill.watermarks()
+        except Exception:
+            # Nothing can be relayed without storage; exit so the process manager restarts us
+            failed.append("storage")
+            supervisor.request_stop()
+            raise
+        inflight.open()
+
+        # Queries work while these build; they only make them fast
+        supervisor.start("indexes", store_functions.configure, restart=False)
+        supervisor.start("usage", rate_limit.sync_loop)
+        supervisor.start("analytics", analytics.flush_loop)
+        supervisor.start("retention", archive.retention_loop)
+        supervisor.start("outbox", outbox.retry_loop)
+        supervisor.start("backfill", lambda: run_backfill(marks), restart=False)
+
+    async def run_backfill(marks):
+        # The unique platform-id indexes are what keep a replayed message from being relayed twice
+        await asyncio.wait([supervisor.tasks["indexes"]])
+        await backfill.run(marks, tg_bot, dc_bot, slack_bot, ready)
+
+    # The API and every platform come up alongside storage; each leg starts relaying once its platform is ready
+    supervisor.start("api", server.serve)
+    supervisor.start("storage", open_storage, restart=False)
+    logger.info("Starting Telegram, Discord and Slack clients...")
+    supervisor.start("telegram", run_telegram)
+    supervisor.start("discord", run_discord)
+    supervisor.start("slack", run_slack)
 
     try:
-        await asyncio.gather(*tasks)
-    except KeyboardInterrupt:
-        logger.info("Shutting down...")
+        await supervisor.wait()
     finally:
-        await tg_client.disconnect()
+        await shutdown(cfg["shutdown_timeout_seconds"], supervisor, inflight, server, reactions, edit_relay,
+                       tg_bot, dc_bot, slack_bot)
+    if failed:
+        raise SystemExit(1)
+
+
+async def shutdown(timeout, supervisor, inflight, server, reactions, edit_relay, tg_bot, dc_bot, slack_bot):
+    """Stop taking new work, let in-flight relays finish, then flush and close everything within `timeout`."""
+    supervisor.request_stop()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+
+    def remaining():
+        return max(deadline - loop.time(), 0.1)
+
+    logger.info("Shutting down, waiting up to %ss for in-flight relays...", timeout)
+    server.should_exit = True
+    outbox.stop()
+    left = await inflight.drain(remaining())
+    if left:
+        logger.warning("%s relays still in flight at the shutdown deadline", left)
+    outbox_task = supervisor.tasks.get("outbox")
+    if outbox_task:
+        # A retry cut off mid-send would be resent on the next start
+        await asyncio.wait([outbox_task], timeout=remaining())
+    api_task = supervisor.tasks.get("api")
+    if api_task:
+        await asyncio.wait([api_task], timeout=remaining())
+
+    # Pending edits and reaction summaries go out while the platform clients are still connected
+    try:
+        await asyncio.wait_for(reactions.flush(), remaining())
+        await asyncio.wait_for(edit_relay.flush(), remaining())
+    except asyncio.TimeoutError:
+        logger.warning("Shutdown deadline reached before all pending edits were mirrored")
+    for flush in (rate_limit.flush_usage, analytics.flush):
+        try:
+            await flush()
+        except Exception as e:
+            logger.error("Shutdown flush failed: %s", e)
+
+    closers = [dc_bot.get_client().close]
+    if tg_bot.get_client() is not None:
+        closers.append(tg_bot.get_client().disconnect)
+    if slack_bot.get_client() is not None:
+        closers.append(slack_bot.get_client().close)
+    for close in closers:
+        try:
+            await asyncio.wait_for(close(), remaining())
+        except Exception as e:
+            logger.error("Error closing platform client: %s", e)
+    await supervisor.cancel()
+    await database.close_db()
+    logger.info("Shutdown complete")
+    stop_logging()
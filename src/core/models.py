@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from typing import Optional
 
 
@@ -29,6 +29,24 @@ class TokenCreate(BaseModel):
     name: str
     description: Optional[str] = None
     expires_in_days: Optional[int] = None
+    requests_per_minute: Optional[int] = None
+    messages_per_minute: Optional[int] = None
+
+    # Same bounds as the RATE_LIMIT_* defaults in load_config; 0 means unlimited
+    @field_validator("requests_per_minute")
+    @classmethod
+    def check_requests_per_minute(cls, value):
+        if value is not None and value < 0:
+            raise ValueError("must be 0 (unlimited) or more")
+        return value
+
+    @field_validator("messages_per_minute")
+    @classmethod
+    def check_messages_per_minute(cls, value):
+        # A message to all three platforms costs 3, so a lower quota could never send one
+        if value is not None and value != 0 and value < 3:
+            raise ValueError("must be 0 (unlimited) or at least 3")
+        return value
 
 
 class TokenResponse(BaseModel):
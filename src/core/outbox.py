@@ -0,0 +1,304 @@
+import asyncio
+import logging
+import os
+import random
+import shutil
+import time
+from bson import ObjectId
+from src.database.database import get_db
+from src.database import store_functions
+from src.core.circuit import CircuitBreaker
+from src.utils.media import SpooledFile, safe_name
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL_SECONDS = 5
+BATCH_SIZE = 50
+BASE_DELAY_SECONDS = 5.0
+MAX_DELAY_SECONDS = 3600.0
+MAX_ATTEMPTS = 8
+
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT_SECONDS = 30.0
+SEND_TIMEOUT_SECONDS = 15.0
+# Attachments of queued deliveries are copied here; the relay's own spool is released once the inline send returns
+SPOOL_DIR = "outbox_files"
+
+# target -> async send(message, reply_to, files) returning the platform message id, or None on failure
+senders = {}
+breakers = {}
+
+# How a retried delivery records the platform id on the stored message
+LINKERS = {
+    "telegram": lambda internal_id, sent: store_functions.set_tg_msg_id(internal_id, int(sent)),
+    "discord": lambda internal_id, sent: store_functions.set_dc_msg_id(internal_id, int(sent)),
+    "slack": store_functions.set_slack_ts,
+}
+PLATFORM_IDS = {
+    "telegram": ("tg_msg_id", int),
+    "discord": ("dc_msg_id", int),
+    "slack": ("slack_ts", str),
+}
+# (source, target) -> the bots' in-memory id map used to resolve replies
+message_maps = {}
+# Set on shutdown: the retry worker finishes the send in progress and takes no new records
+stopped = asyncio.Event()
+
+
+def configure(base_delay=None, max_delay=None, max_attempts=None, failure_threshold=None, reset_timeout=None,
+              send_timeout=None, spool_dir=None):
+    global BASE_DELAY_SECONDS, MAX_DELAY_SECONDS, MAX_ATTEMPTS, FAILURE_THRESHOLD, RESET_TIMEOUT_SECONDS, SEND_TIMEOUT_SECONDS, SPOOL_DIR
+    if base_delay:
+        BASE_DELAY_SECONDS = base_delay
+    if max_delay:
+        MAX_DELAY_SECONDS = max_delay
+    if max_attempts:
+        MAX_ATTEMPTS = max_attempts
+    if failure_threshold:
+        FAILURE_THRESHOLD = failure_threshold
+    if reset_timeout:
+        RESET_TIMEOUT_SECONDS = reset_timeout
+    if send_timeout:
+        SEND_TIMEOUT_SECONDS = send_timeout
+    if spool_dir:
+        SPOOL_DIR = spool_dir
+
+
+def register_sender(target, send):
+    senders[target] = send
+    breakers[target] = CircuitBreaker(target, FAILURE_THRESHOLD, RESET_TIMEOUT_SECONDS, SEND_TIMEOUT_SECONDS)
+
+
+def set_message_maps(maps):
+    message_maps.update(maps)
+
+
+def _copy_files(record_id, files):
+    folder = os.path.join(SPOOL_DIR, str(record_id))
+    os.makedirs(folder, exist_ok=True)
+    kept = []
+    for i, f in enumerate(files):
+        path = os.path.join(folder, f"{i}_{safe_name(f.name)}")
+        shutil.copyfile(f.path, path)
+        kept.append({"name": f.name, "path": path})
+    return kept
+
+
+async def _keep_files(record_id, files):
+    """Durable copies of a delivery's attachments, so a later retry still has them."""
+    if not files:
+        return []
+    return await asyncio.to_thread(_copy_files, record_id, files)
+
+
+def _discard_files(record):
+    if record.get("files"):
+        shutil.rmtree(os.path.join(SPOOL_DIR, str(record["_id"])), ignore_errors=True)
+
+
+def backoff(attempts):
+    """Exponential backoff with jitter, so a recovering platform isn't hit by every retry at once."""
+    delay = min(MAX_DELAY_SECONDS, BASE_DELAY_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def shape(record):
+    out = {k: v for k, v in record.items() if k not in ("_id", "files")}
+    out["id"] = str(record["_id"])
+    out["files"] = [f["name"] for f in record.get("files", [])]
+    return out
+
+
+async def _send(record, files):
+    send = senders.get(record["target"])
+    if send is None:
+        raise RuntimeError(f"No sender registered for {record['target']}")
+    breaker = breakers[record["target"]]
+    try:
+        # A hung platform costs at most the timeout budget, not the caller's whole handler
+        sent = await asyncio.wait_for(send(record["text"], record.get("reply_to"), files), breaker.call_timeout)
+    except asyncio.TimeoutError:
+        breaker.record_failure(timeout=True)
+        raise RuntimeError(f"{record['target']} send timed out after {breaker.call_timeout}s")
+    except Exception:
+        breaker.record_failure()
+        raise
+    if not sent:
+        breaker.record_failure()
+        raise RuntimeError(f"{record['target']} returned no message id")
+    breaker.record_success()
+    return sent
+
+
+async def _failed(record, error, files=None, dead=False):
+    attempts = record.get("attempts", 0) + 1
+    update = {"attempts": attempts, "last_error": str(error)[:500], "updated_at": time.time()}
+    if files is not None:
+        update["files"] = files
+    if dead or attempts >= MAX_ATTEMPTS:
+        update["status"] = "dead"
+        logger.error("Delivery of %s to %s failed permanently: %s", record.get("message_id"), record["target"], error)
+    else:
+        update["status"] = "pending"
+        update["next_at"] = time.time() + backoff(attempts)
+        logger.warning("Delivery of %s to %s failed (attempt %s), will retry: %s",
+                       record.get("message_id"), record["target"], attempts, error)
+    await get_db()["outbox"].update_one({"_id": record["_id"]}, {"$set": update})
+
+
+async def deliver(target, message, reply_to=None, files=None, internal_id=None):
+    """Send now, keeping a durable record until the send succeeds; returns the platform id or None.
+
+    While the target's circuit is open the delivery is only queued, so callers never wait on a failing platform.
+    """
+    col = get_db()["outbox"]
+    breaker = breakers.get(target)
+    deferred = breaker is not None and not breaker.allow()
+    try:
+        record = {
+            "_id": ObjectId(),
+            "target": target,
+            "message_id": internal_id,
+            "text": message,
+            "reply_to": reply_to,
+            "files": [{"name": f.name, "path": f.path} for f in files or []],
+            # "sending" keeps the retry worker away from a delivery that is still in flight
+            "status": "pending" if deferred else "sending",
+            "attempts": 0,
+            "created_at": time.time(),
+            "next_at": breaker.retry_at() if deferred else time.time(),
+        }
+        if deferred:
+            try:
+                record["files"] = await _keep_files(record["_id"], files)
+            except OSError as e:
+                record.update(status="dead", last_error=f"attachments could not be kept: {e}")
+        await col.insert_one(record)
+        if deferred:
+            return None
+        try:
+            sent = await _send(record, files)
+        except Exception as e:
+            try:
+                kept = await _keep_files(record["_id"], files)
+            except OSError as copy_error:
+                # Without its attachments the retry would post text only, so the delivery goes to the dead letters
+                await _failed(record, f"{e}; attachments could not be kept: {copy_error}", dead=True)
+                return None
+            await _failed(record, e, files=kept)
+            return None
+        await col.delete_one({"_id": record["_id"]})
+        return sent
+    finally:
+        if breaker is not None and not deferred:
+            # A probe that ended without a verdict (cancelled, or failed before the send) mustn't block the circuit
+            breaker.release()
+
+
+async def _remember(record, sent):
+    """Record a late delivery the way the inline path does, so replies to the message keep their threading."""
+    internal_id, target = record.get("message_id"), record["target"]
+    if not internal_id:
+        return
+    if target in LINKERS:
+        await LINKERS[target](internal_id, sent)
+    m = await store_functions.get_message(internal_id)
+    if not m or m.get("source") not in PLATFORM_IDS:
+        return
+    field, _ = PLATFORM_IDS[m["source"]]
+    _, parse = PLATFORM_IDS[target]
+    source_id = m.get(field)
+    forward, backward = message_maps.get((m["source"], target)), message_maps.get((target, m["source"]))
+    if source_id is None or forward is None or backward is None:
+        return
+    forward[source_id] = parse(sent)
+    backward[parse(sent)] = source_id
+
+
+async def _retry(record):
+    col = get_db()["outbox"]
+    missing = [f["name"] for f in record.get("files", []) if not os.path.exists(f["path"])]
+    if missing:
+        await _failed(record, f"attachments no longer on disk: {', '.join(missing)}", dead=True)
+        return False
+    files = [SpooledFile(f["name"], None, None, f["path"]) for f in record.get("files", [])]
+    try:
+        sent = await _send(record, files)
+    except Exception as e:
+        await _failed(record, e)
+        return False
+    await col.delete_one({"_id": record["_id"]})
+    _discard_files(record)
+    await _remember(record, sent)
+    logger.info("Delivered %s to %s after %s failed attempts", record.get("message_id"), record["target"], record.get("attempts", 0))
+    return True
+
+
+async def retry_due():
+    col = get_db()["outbox"]
+    now = time.time()
+    cursor = col.find({"status": "pending", "next_at": {"$lte": now}}, sort=[("next_at", 1)], limit=BATCH_SIZE)
+    records = await cursor.to_list(length=BATCH_SIZE)
+    for record in records:
+        if stopped.is_set():
+            break
+        breaker = breakers.get(record["target"])
+        if breaker is not None and not breaker.allow():
+            # Not an attempt: wait for the circuit's next probe window
+            await col.update_one({"_id": record["_id"]}, {"$set": {"next_at": breaker.retry_at()}})
+            continue
+        try:
+            await col.update_one({"_id": record["_id"]}, {"$set": {"status": "sending"}})
+            await _retry(record)
+        finally:
+            if breaker is not None:
+                breaker.release()
+    return len(records)
+
+
+async def recover():
+    """Requeue deliveries that were in flight when the process stopped."""
+    await get_db()["outbox"].update_many({"status": "sending"}, {"$set": {"status": "pending", "next_at": time.time()}})
+
+
+async def retry_loop(interval=POLL_INTERVAL_SECONDS):
+    await recover()
+    while not stopped.is_set():
+        try:
+            await retry_due()
+        except Exception as e:
+            logger.error("Outbox retry run failed: %s", e)
+        try:
+            await asyncio.wait_for(stopped.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+def stop():
+    """Let the retry worker finish its current send and exit; cancelling it mid-send would leave the record in
+    `sending` and resend it on the next start."""
+    stopped.set()
+
+
+async def list_records(status="dead", limit=100):
+    cursor = get_db()["outbox"].find({"status": status}, sort=[("next_at", -1)], limit=limit)
+    return [shape(r) for r in await cursor.to_list(length=limit)]
+
+
+async def requeue(record_id):
+    if not ObjectId.is_valid(record_id):
+        return False
+    result = await get_db()["outbox"].update_one(
+        {"_id": ObjectId(record_id), "status": "dead"},
+        {"$set": {"status": "pending", "attempts": 0, "next_at": time.time()}},
+    )
+    return result.modified_count > 0
+
+
+def circuit_states():
+    return {target: breaker.snapshot() for target, breaker in breakers.items()}
+
+
+async def counts():
+    col = get_db()["outbox"]
+    return {status: await col.count_documents({"status": status}) for status in ("pending", "sending", "dead")}
@@ -0,0 +1,87 @@
+import asyncio
+import logging
+from src.core.edits import SOURCES
+from src.database import store_functions
+
+logger = logging.getLogger(__name__)
+
+REACTION_WINDOW_SECONDS = 5.0
+
+# Slack reports reactions by name; the common ones are mapped so they merge with the other platforms
+SLACK_EMOJI = {
+    "+1": "👍", "thumbsup": "👍", "-1": "👎", "thumbsdown": "👎", "heart": "❤️", "joy": "😂",
+    "laughing": "😆", "smile": "😄", "tada": "🎉", "fire": "🔥", "eyes": "👀", "pray": "🙏",
+    "clap": "👏", "ok_hand": "👌", "rocket": "🚀", "100": "💯", "white_check_mark": "✅",
+    "thinking_face": "🤔", "cry": "😢", "heart_eyes": "😍", "wave": "👋", "raised_hands": "🙌",
+}
+
+
+def slack_emoji(name):
+    name = name.split("::")[0]
+    return SLACK_EMOJI.get(name, f":{name}:")
+
+
+def emoji_key(emoji):
+    """Reaction keys become document field names, which can't contain dots or start with `$`."""
+    return emoji.replace(".", "_").lstrip("$") or "?"
+
+
+class ReactionAggregator:
+    """Collect reaction changes per message and apply them once per window.
+
+    Each flush is one `$inc` per message and one summary edit per mirrored copy, however many reactions came in.
+    """
+
+    def __init__(self, edit_relay, window=REACTION_WINDOW_SECONDS):
+        self.edit_relay = edit_relay
+        self.window = window
+        self.deltas = {}
+        self.totals = {}
+        self.task = None
+
+    def added(self, source, message_id, emoji, count=1):
+        counts = self.deltas.setdefault((source, message_id), {})
+        key = emoji_key(emoji)
+        counts[key] = counts.get(key, 0) + count
+        self._schedule()
+
+    def removed(self, source, message_id, emoji):
+        self.added(source, message_id, emoji, -1)
+
+    def counted(self, source, message_id, counts):
+        """Platforms that report full per-message counts (Telegram) replace rather than increment."""
+        self.totals[(source, message_id)] = {emoji_key(e): c for e, c in counts.items()}
+        self.deltas.pop((source, message_id), None)
+        self._schedule()
+
+    def _schedule(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
+        await self.flush()
+
+    async def flush(self):
+        deltas, self.deltas = self.deltas, {}
+        totals, self.totals = self.totals, {}
+        changed = {}
+        for (source, message_id), counts in list(deltas.items()) + list(totals.items()):
+            try:
+                m = await SOURCES[source](message_id)
+                if not m:
+                    continue
+                if (source, message_id) in totals:
+                    await store_functions.set_reactions(m["id"], source, counts)
+                else:
+                    counts = {e: c for e, c in counts.items() if c}
+                    if not counts:
+                        continue
+                    await store_functions.add_reactions(m["id"], source, counts)
+                changed.setdefault(m["id"], set()).add(source)
+            except Exception as e:
+                logger.error("Failed to store reactions for %s message %s: %s", source, message_id, e)
+        for internal_id, sources in changed.items():
+            m = await store_functions.get_message(internal_id)
+            if m:
+                self.edit_relay.refresh(m, changed_sources=sources)
@@ -0,0 +1,132 @@
+import asyncio
+import functools
+import logging
+import time
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+INITIAL_BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 60.0
+# A task that ran this long before failing starts again from the initial backoff
+STABLE_SECONDS = 60.0
+
+
+class Supervisor:
+    """Run long-lived tasks, restarting any that fail with exponential backoff while the rest keep going."""
+
+    def __init__(self):
+        self.tasks = {}
+        # running, backoff (waiting to restart after a failure), done or failed
+        self.task_states = {}
+        self.stopping = asyncio.Event()
+
+    def start(self, name, factory, restart=True):
+        """`factory` returns a fresh coroutine for each (re)start."""
+        self.tasks[name] = asyncio.create_task(self._supervise(name, factory, restart), name=name)
+
+    async def _supervise(self, name, factory, restart):
+        delay = INITIAL_BACKOFF_SECONDS
+        while not self.stopping.is_set():
+            started = time.monotonic()
+            self.task_states[name] = "running"
+            try:
+                await factory()
+                if not restart or self.stopping.is_set():
+                    self.task_states[name] = "done"
+                    return
+                logger.warning("%s exited, restarting in %.1fs", name, delay)
+            except asyncio.CancelledError:
+                self.task_states[name] = "done"
+                raise
+            except Exception as e:
+                self.task_states[name] = "failed"
+                if not restart:
+                    logger.error("%s failed: %s", name, e)
+                    return
+                logger.error("%s crashed, restarting in %.1fs: %s", name, delay, e)
+            if time.monotonic() - started > STABLE_SECONDS:
+                delay = INITIAL_BACKOFF_SECONDS
+            self.task_states[name] = "backoff"
+            try:
+                await asyncio.wait_for(self.stopping.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            delay = min(delay * 2, MAX_BACKOFF_SECONDS)
+        self.task_states[name] = "done"
+
+    def request_stop(self):
+        if not self.stopping.is_set():
+            logger.info("Shutdown requested")
+            self.stopping.set()
+
+    async def wait(self):
+        await self.stopping.wait()
+
+    async def cancel(self, timeout=5.0):
+        for task in self.tasks.values():
+            task.cancel()
+        if self.tasks:
+            await asyncio.wait(list(self.tasks.values()), timeout=timeout)
+
+    def states(self):
+        return {name: self.task_states.get(name, "running") for name in self.tasks}
+
+
+class InFlight:
+    """Count relays in progress so shutdown can wait for them, and refuse new ones once draining.
+
+    Handlers called before `open()` wait for it, so events arriving while storage is still coming up aren't lost.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.accepting = True
+        self.opened = asyncio.Event()
+        self.idle = asyncio.Event()
+        self.idle.set()
+
+    @asynccontextmanager
+    async def track(self):
+        self.count += 1
+        self.idle.clear()
+        try:
+            yield
+        finally:
+            self.count -= 1
+            if self.count == 0:
+                self.idle.set()
+
+    def guard(self, obj, *names, during_drain=False):
+        """Wrap handler methods on `obj` in place; must run before the handlers are registered with a client.
+
+        Once draining, new messages are refused and left for the next start's backfill. Handlers passed with
+        `during_drain=True` (edits, deletes, reactions, which backfill can't replay) keep running until the clients
+        close, and shutdown flushes what they queue.
+        """
+        for name in names:
+            handler = getattr(obj, name)
+
+            @functools.wraps(handler)
+            async def guarded(*args, handler=handler, **kwargs):
+                await self.opened.wait()
+                if not self.accepting and not during_drain:
+                    return None
+                async with self.track():
+                    return await handler(*args, **kwargs)
+
+            setattr(obj, name, guarded)
+
+    def open(self):
+        self.opened.set()
+
+    async def drain(self, timeout):
+        """Stop accepting new relays and wait up to `timeout` for the running ones; returns how many were left."""
+        self.accepting = False
+        # Releases handlers still waiting for open(), which then return without relaying
+        self.opened.set()
+        try:
+            await asyncio.wait_for(self.idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.count
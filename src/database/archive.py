@@ -0,0 +1,145 @@
+import asyncio
+import json
+import logging
+import re
+import time
+import zlib
+from datetime import datetime, timezone
+from src.database.database import get_db, get_history_db
+from src.database.store_functions import api_shape, id_before
+from src.utils.cache import response_cache
+from src.utils.serialize import dumps
+
+logger = logging.getLogger(__name__)
+
+RETENTION_DAYS = 0
+ARCHIVE_ENABLED = True
+BATCH_SIZE = 500
+INTERVAL_SECONDS = 3600
+
+
+def month_of(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime("%Y-%m")
+
+
+def compress(messages):
+    return zlib.compress(dumps(messages), 6)
+
+
+def decompress(data):
+    return json.loads(zlib.decompress(data))
+
+
+def configure(retention_days=None, archive_enabled=None, interval_seconds=None):
+    global RETENTION_DAYS, ARCHIVE_ENABLED, INTERVAL_SECONDS
+    if retention_days is not None:
+        RETENTION_DAYS = retention_days
+    if archive_enabled is not None:
+        ARCHIVE_ENABLED = archive_enabled
+    if interval_seconds:
+        INTERVAL_SECONDS = interval_seconds
+
+
+async def archive_batch(cutoff):
+    """Move up to BATCH_SIZE messages older than `cutoff` into compressed monthly buckets; returns the count."""
+    db = get_db()
+    col = db["messages"]
+    cursor = col.find({"_id": {"$lt": id_before(cutoff)}}, sort=[("_id", 1)], limit=BATCH_SIZE)
+    docs = await cursor.to_list(length=BATCH_SIZE)
+    if not docs:
+        return 0
+
+    if ARCHIVE_ENABLED:
+        months = {}
+        for d in docs:
+            months.setdefault(month_of(d["ts"]), []).append(api_shape(d))
+        for month, messages in months.items():
+            # Written before the delete below: a crash in between leaves a duplicate, never a loss
+            await db["messages_archive"].insert_one({
+                "month": month,
+                "first_ts": messages[0]["timestamp"],
+                "last_ts": messages[-1]["timestamp"],
+                "count": len(messages),
+                "ids": [m["id"] for m in messages],
+                "data": compress(messages),
+            })
+
+    await col.delete_many({"_id": {"$in": [d["_id"] for d in docs]}})
+    response_cache.invalidate()
+    return len(docs)
+
+
+async def run_retention():
+    if not RETENTION_DAYS:
+        return 0
+    cutoff = time.time() - RETENTION_DAYS * 86400
+    total = 0
+    while True:
+        moved = await archive_batch(cutoff)
+        total += moved
+        if moved < BATCH_SIZE:
+            break
+    if total:
+        logger.info("Retention moved %s messages older than %s days out of the hot collection", total, RETENTION_DAYS)
+    return total
+
+
+async def retention_loop():
+    while True:
+        try:
+            await run_retention()
+        except Exception as e:
+            logger.error("Retention run failed: %s", e)
+        await asyncio.sleep(INTERVAL_SECONDS)
+
+
+def select_fields(message, fields):
+    """Archived messages are kept in API shape; narrow one to `fields` the way projection() does for stored ones."""
+    if not fields:
+        return message
+    return {k: v for k, v in message.items() if k == "id" or k in fields}
+
+
+async def find_archived(internal_id, fields=None):
+    db = get_history_db()
+    bucket = await db["messages_archive"].find_one({"ids": internal_id})
+    if not bucket:
+        return None
+    for m in decompress(bucket["data"]):
+        if m["id"] == internal_id:
+            return select_fields(m, fields)
+    return None
+
+
+async def search_archive(month=None, query=None, source=None, username=None, since=None, until=None, limit=50):
+    db = get_history_db()
+    flt = {}
+    if month:
+        flt["month"] = month
+    if since is not None:
+        flt["last_ts"] = {"$gte": float(since)}
+    if until is not None:
+        flt["first_ts"] = {"$lte": float(until)}
+    pattern = re.compile(re.escape(query), re.IGNORECASE) if query else None
+
+    results = []
+    seen = set()
+    async for bucket in db["messages_archive"].find(flt, sort=[("first_ts", -1)]):
+        for m in reversed(decompress(bucket["data"])):
+            if m["id"] in seen:
+                continue
+            if pattern and not pattern.search(m.get("text", "")):
+                continue
+            if source and m.get("source") != source:
+                continue
+            if username and m.get("username") != username:
+                continue
+            if since is not None and m["timestamp"] < since:
+                continue
+            if until is not None and m["timestamp"] > until:
+                continue
+            seen.add(m["id"])
+            results.append(m)
+            if len(results) >= limit:
+                return results
+    return results
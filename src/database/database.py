@@ -1,21 +1,97 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Optional
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReadPreference
 
 client = None
 db = None
+history_db = None
+sqlite_db = None
+# Set once startup migrations are done; the API answers 503 until then
+ready = asyncio.Event()
 
-async def init_db(mongo_uri, mongo_db):
-    global client, db
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+
+@dataclass
+class DatabaseOptions:
+    max_pool_size: int = 100
+    min_pool_size: int = 0
+    max_idle_time_ms: Optional[int] = None
+    server_selection_timeout_ms: int = 30000
+    connect_timeout_ms: int = 20000
+    socket_timeout_ms: Optional[int] = None
+    compressors: Optional[str] = None
+    # Read preference for history/API reads; writes and relay lookups always use the primary
+    history_read_preference: str = "primary"
+
+    def client_kwargs(self):
+        kwargs = {
+            "maxPoolSize": self.max_pool_size,
+            "minPoolSize": self.min_pool_size,
+            "serverSelectionTimeoutMS": self.server_selection_timeout_ms,
+            "connectTimeoutMS": self.connect_timeout_ms,
+        }
+        if self.max_idle_time_ms is not None:
+            kwargs["maxIdleTimeMS"] = self.max_idle_time_ms
+        if self.socket_timeout_ms is not None:
+            kwargs["socketTimeoutMS"] = self.socket_timeout_ms
+        if self.compressors:
+            kwargs["compressors"] = self.compressors
+        return kwargs
+
+
+async def init_db(mongo_uri, mongo_db, options: Optional[DatabaseOptions] = None):
+    global client, db, history_db
+    options = options or DatabaseOptions()
+    if options.history_read_preference not in READ_PREFERENCES:
+        raise ValueError(f"Unknown read preference: {options.history_read_preference}")
     try:
-        client = AsyncIOMotorClient(mongo_uri)
+        client = AsyncIOMotorClient(mongo_uri, **options.client_kwargs())
         await client.admin.command('ping')
         db = client[mongo_db]
+        history_db = db.with_options(read_preference=READ_PREFERENCES[options.history_read_preference])
         return db
     except Exception as e:
         raise
 
+async def init_sqlite(path):
+    global db, history_db, sqlite_db
+    from src.database.sqlite_backend import open_database
+
+    sqlite_db = await open_database(path)
+    db = history_db = sqlite_db
+    return db
+
+
+async def close_db():
+    global client, db, history_db, sqlite_db
+    if sqlite_db is not None:
+        await sqlite_db.engine.close()
+        sqlite_db = None
+    if client is not None:
+        client.close()
+        client = None
+    db = history_db = None
+    ready.clear()
+
+
+def mark_ready():
+    ready.set()
+
+
 def get_db():
     return db
 
+def get_history_db():
+    return history_db if history_db is not None else db
+
 def get_client():
     return client
-
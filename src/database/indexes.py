@@ -0,0 +1,163 @@
+import asyncio
+import logging
+from src.database.database import get_db
+
+logger = logging.getLogger(__name__)
+
+TEXT_INDEX = "t_text_u_text"
+
+# Every index the application relies on, per collection: (keys, options)
+INDEXES = {
+    "messages": [
+        # Unique, so a message reaching both the live handler and startup backfill is stored (and relayed) once
+        ([("p.tg", 1)], {"sparse": True, "unique": True}),
+        ([("p.dc", 1)], {"sparse": True, "unique": True}),
+        ([("p.sk", 1)], {"sparse": True, "unique": True}),
+        ([("r", 1)], {"sparse": True}),
+        ([("lid", 1)], {"sparse": True}),
+        ([("s", 1), ("_id", -1)], {}),
+        ([("u", 1), ("_id", -1)], {}),
+        ([("tr", 1), ("_id", 1)], {}),
+        ([("t", "text"), ("u", "text")], {"name": TEXT_INDEX, "default_language": "none"}),
+    ],
+    "messages_archive": [
+        ([("month", 1), ("first_ts", 1)], {}),
+        ([("first_ts", -1)], {}),
+        ([("ids", 1)], {}),
+    ],
+    "api_tokens": [
+        ([("token_hash", 1)], {"unique": True}),
+        ([("name", 1)], {}),
+        ([("created_at", -1)], {}),
+    ],
+    "admins": [
+        ([("username", 1)], {"unique": True}),
+    ],
+    "admin_sessions": [
+        ([("session_hash", 1)], {"unique": True}),
+        ([("expires_at", 1)], {"expireAfterSeconds": 0}),
+    ],
+    "token_usage": [
+        ([("bucket_start", 1), ("token_hash", 1)], {}),
+    ],
+    "outbox": [
+        ([("status", 1), ("next_at", 1)], {}),
+    ],
+}
+
+# Indexes from before the compact schema, dropped on startup by name: the time-ordered _id covers timestamp_1,
+# and the others are on fields the schema renamed
+OBSOLETE_INDEXES = {
+    "messages": ["timestamp_1", "tg_msg_id_1", "dc_msg_id_1", "slack_ts_1"],
+}
+
+# Representative filter/sort for each query issued by store_functions, archive and auth_manager
+QUERY_SHAPES = [
+    ("list_messages", "messages", {"_id": {"$lt": "x"}}, [("_id", -1)]),
+    ("get_message", "messages", {"_id": "x"}, None),
+    ("get_legacy_message", "messages", {"lid": "x"}, None),
+    ("find_by_tg_id", "messages", {"p.tg": 1}, None),
+    ("find_by_dc_id", "messages", {"p.dc": 1}, None),
+    ("find_by_slack_ts", "messages", {"p.sk": "1.0"}, None),
+    ("last_tg_id", "messages", {"p.tg": {"$exists": True}}, [("p.tg", -1)]),
+    ("replies_to", "messages", {"r": "x"}, None),
+    ("get_thread", "messages", {"tr": "x"}, [("_id", 1)]),
+    ("search_by_source", "messages", {"s": "telegram", "_id": {"$gte": "x"}}, [("_id", -1)]),
+    ("search_by_username", "messages", {"u": "x", "_id": {"$gte": "x"}}, [("_id", -1)]),
+    ("search_text", "messages", {"$text": {"$search": "x"}}, [("_id", -1)]),
+    ("search_by_time", "messages", {"_id": {"$gte": "x"}, "ts": {"$gte": 0.0}}, [("_id", -1)]),
+    ("retention", "messages", {"_id": {"$lt": "x"}}, [("_id", 1)]),
+    ("find_archived", "messages_archive", {"ids": "x"}, None),
+    ("search_archive", "messages_archive", {"month": "2024-01"}, [("first_ts", -1)]),
+    ("verify_token", "api_tokens", {"token_hash": "x", "is_active": True}, None),
+    ("list_tokens", "api_tokens", {}, [("created_at", -1)]),
+    ("revoke_token", "api_tokens", {"name": "x"}, None),
+    ("authenticate_admin", "admins", {"username": "x"}, None),
+    ("verify_session", "admin_sessions", {"session_hash": "x"}, None),
+    ("usage_report", "token_usage", {"bucket_start": {"$gte": 0}}, None),
+    ("outbox_due", "outbox", {"status": "pending", "next_at": {"$lte": 0.0}}, [("next_at", 1)]),
+    ("outbox_dead", "outbox", {"status": "dead"}, [("next_at", -1)]),
+]
+
+
+async def ensure_indexes():
+    """Build every index in INDEXES and drop the obsolete ones; returns the (collection, name) pairs that exist."""
+    db = get_db()
+    created = set()
+    for collection, indexes in INDEXES.items():
+        for keys, options in indexes:
+            try:
+                created.add((collection, await db[collection].create_index(keys, **options)))
+            except Exception as e:
+                if any(direction == "text" for _, direction in keys):
+                    # Servers without text search (and the SQLite backend) fall back to regex matching
+                    logger.info("Text index on %s not available: %s", collection, e)
+                else:
+                    logger.error("Failed to create index %s on %s: %s", keys, collection, e)
+    for collection, names in OBSOLETE_INDEXES.items():
+        for name in names:
+            try:
+                await db[collection].drop_index(name)
+            except Exception:
+                pass
+    return created
+
+
+def plan_stages(plan):
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(plan_stages(item))
+    return stages
+
+
+async def explain_queries():
+    """Explain every known query shape and report which ones fall back to a collection scan."""
+    db = get_db()
+    report = []
+    for name, collection, flt, sort in QUERY_SHAPES:
+        command = {"find": collection, "filter": flt}
+        if sort:
+            command["sort"] = dict(sort)
+        try:
+            result = await db.command("explain", command, verbosity="queryPlanner")
+            stages = plan_stages(result.get("queryPlanner", {}).get("winningPlan", {}))
+            report.append({"query": name, "collection": collection, "stages": stages, "collscan": "COLLSCAN" in stages})
+        except Exception as e:
+            report.append({"query": name, "collection": collection, "error": str(e)})
+    return report
+
+
+async def main():
+    from src.config import load_config
+    from src.database import database
+
+    cfg = load_config()
+    if cfg["storage_backend"] == "sqlite":
+        await database.init_sqlite(cfg["sqlite_path"])
+    else:
+        await database.init_db(cfg["mongo_uri"], cfg["mongo_db"], database.DatabaseOptions(**cfg["mongo_options"]))
+    await ensure_indexes()
+    report = await explain_queries()
+
+    collscans = 0
+    for row in report:
+        if "error" in row:
+            status = f"ERROR {row['error']}"
+        elif row["collscan"]:
+            status = "COLLSCAN"
+            collscans += 1
+        else:
+            status = "ok"
+        stages = " > ".join(row.get("stages", []))
+        print(f"{row['query']:<22} {row['collection']:<18} {status:<9} {stages}")
+    print(f"\n{collscans} of {len(report)} query shapes use a collection scan")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
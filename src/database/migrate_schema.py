@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import time
+from src.database.database import get_db
+from src.database.indexes import OBSOLETE_INDEXES
+from src.database.store_functions import FIELD_PATHS, compact, new_id
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+# Marker in the `migrations` collection, so later boots skip the (unindexed) legacy-document check
+MARKER_ID = "compact_schema"
+
+
+async def _new_id_for(col, legacy_id, id_map):
+    if legacy_id is None:
+        return None
+    if legacy_id not in id_map:
+        migrated = await col.find_one({"lid": legacy_id}, {"_id": 1})
+        # Parents that were never stored keep their old id so the reference is still recognisable
+        id_map[legacy_id] = migrated["_id"] if migrated else legacy_id
+    return id_map[legacy_id]
+
+
+async def migrate_messages(batch_size=BATCH_SIZE):
+    """Rewrite messages stored with long field names into the compact schema; returns the count.
+
+    Safe to re-run: a message already copied (matched by `lid`) only has its legacy document removed. Once finished
+    it leaves a marker, and later calls return straight away.
+    """
+    db = get_db()
+    col = db["messages"]
+    if await db["migrations"].find_one({"_id": MARKER_ID}):
+        return 0
+    # Every legacy document is looked up by `lid`; the background index build would come too late for this
+    await col.create_index([("lid", 1)], sparse=True)
+    legacy = {"source": {"$exists": True}}
+
+    id_map = {}
+    total = 0
+    while True:
+        # Oldest first, so parents are converted before their replies
+        cursor = col.find(legacy, sort=[("timestamp", 1)], limit=batch_size)
+        docs = await cursor.to_list(length=batch_size)
+        if not docs:
+            break
+        for d in docs:
+            existing = await col.find_one({"lid": d["_id"]}, {"_id": 1})
+            if existing:
+                id_map[d["_id"]] = existing["_id"]
+            else:
+                internal_id = new_id(d.get("timestamp"))
+                id_map[d["_id"]] = internal_id
+                fields = {name: d.get(name) for name in FIELD_PATHS}
+                fields["reply_to_id"] = await _new_id_for(col, d.get("reply_to_id"), id_map)
+                fields["thread_root"] = await _new_id_for(col, d.get("thread_root") or d["_id"], id_map)
+                doc = compact(fields)
+                doc["_id"] = internal_id
+                doc["lid"] = d["_id"]
+                await col.insert_one(doc)
+            await col.delete_one({"_id": d["_id"]})
+        total += len(docs)
+        logger.info("Migrated %s messages to the compact schema", total)
+
+    # ensure_indexes drops these too; done here as well so a standalone run leaves no index on the long names
+    for name in OBSOLETE_INDEXES["messages"]:
+        try:
+            await col.drop_index(name)
+        except Exception:
+            pass
+    await db["migrations"].update_one({"_id": MARKER_ID}, {"$set": {"done_at": time.time(), "migrated": total}},
+                                      upsert=True)
+    return total
+
+
+async def main():
+    from src.config import load_config
+    from src.database import database
+
+    cfg = load_config()
+    if cfg["storage_backend"] == "sqlite":
+        await database.init_sqlite(cfg["sqlite_path"])
+    else:
+        await database.init_db(cfg["mongo_uri"], cfg["mongo_db"], database.DatabaseOptions(**cfg["mongo_options"]))
+    total = await migrate_messages()
+    await database.close_db()
+    print(f"Migrated {total} messages to the compact schema")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,665 @@
+"""Embedded SQLite storage exposing the subset of the Motor database/collection API the app uses.
+
+Each collection is a table of JSON documents. Indexes become SQLite expression indexes over
+json_extract(), filters are pushed down to SQL where they map cleanly and re-checked in Python,
+and all I/O runs on one dedicated thread with WAL journaling and batched commits.
+"""
+import asyncio
+import base64
+import copy
+import json
+import logging
+import re
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+logger = logging.getLogger(__name__)
+
+COMMIT_INTERVAL_SECONDS = 0.05
+COMMIT_BATCH_SIZE = 200
+TTL_INTERVAL_SECONDS = 60
+
+# Non-JSON values are stored as tagged strings whose lexical order matches their natural order
+TAG = "\x1d"
+
+
+def encode(value):
+    if isinstance(value, dict):
+        return {k: encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode(v) for v in value]
+    if isinstance(value, ObjectId):
+        return f"{TAG}O:{value}"
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return f"{TAG}D:{value.strftime('%Y-%m-%dT%H:%M:%S.%f')}"
+    if isinstance(value, (bytes, bytearray)):
+        return f"{TAG}B:{base64.b64encode(bytes(value)).decode()}"
+    if isinstance(value, str) and value.startswith(TAG):
+        # Plain text that happens to start with the tag is escaped, so it can't pass for a tagged value
+        return f"{TAG}S:{value}"
+    return value
+
+
+def decode(value):
+    if isinstance(value, dict):
+        return {k: decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [decode(v) for v in value]
+    if isinstance(value, str) and value.startswith(TAG):
+        kind, raw = value[1], value[3:]
+        if kind == "O":
+            return ObjectId(raw)
+        if kind == "D":
+            # Motor returns naive UTC datetimes by default; mirror that
+            return datetime.strptime(raw, "%Y-%m-%dT%H:%M:%S.%f")
+        if kind == "B":
+            return base64.b64decode(raw)
+        if kind == "S":
+            return raw
+    return value
+
+
+def json_path(field):
+    return "$" + "".join(f'."{part}"' for part in field.split("."))
+
+
+def column(field):
+    if field == "_id":
+        return "id"
+    return f"json_extract(doc, '{json_path(field)}')"
+
+
+def key_param(value):
+    return json.dumps(encode(value), separators=(",", ":"))
+
+
+def sql_param(field, value):
+    return key_param(value) if field == "_id" else encode(value)
+
+
+def get_path(doc, field):
+    """Resolve a dotted path; returns (found, value) and fans out over arrays like Mongo does."""
+    current = [doc]
+    for part in field.split("."):
+        nxt = []
+        for item in current:
+            if isinstance(item, dict) and part in item:
+                nxt.append(item[part])
+            elif isinstance(item, list):
+                for sub in item:
+                    if isinstance(sub, dict) and part in sub:
+                        nxt.append(sub[part])
+        if not nxt:
+            return False, None
+        current = nxt
+    return True, current[0] if len(current) == 1 else current
+
+
+def candidates(value):
+    if isinstance(value, list):
+        return [value] + value
+    return [value]
+
+
+def compare(a, b, op):
+    try:
+        if op == "$gt":
+            return a > b
+        if op == "$gte":
+            return a >= b
+        if op == "$lt":
+            return a < b
+        if op == "$lte":
+            return a <= b
+    except TypeError:
+        return False
+    return False
+
+
+def match_condition(doc, field, cond):
+    found, value = get_path(doc, field)
+    if isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond):
+        for op, arg in cond.items():
+            if op == "$options":
+                continue
+            if op == "$eq":
+                if not match_condition(doc, field, arg):
+                    return False
+            elif op == "$ne":
+                if found and any(v == arg for v in candidates(value)):
+                    return False
+                if not found and arg is None:
+                    return False
+            elif op == "$exists":
+                if bool(arg) != found:
+                    return False
+            elif op in ("$gt", "$gte", "$lt", "$lte"):
+                if not found or not any(compare(v, arg, op) for v in candidates(value)):
+                    return False
+            elif op == "$in":
+                if not any(match_condition(doc, field, a) for a in arg):
+                    return False
+            elif op == "$nin":
+                if any(match_condition(doc, field, a) for a in arg):
+                    return False
+            elif op == "$all":
+                values = value if isinstance(value, list) else [value]
+                if not found or not all(a in values for a in arg):
+                    return False
+            elif op == "$regex":
+                flags = re.IGNORECASE if "i" in cond.get("$options", "") else 0
+                pattern = re.compile(arg, flags)
+                if not found or not any(isinstance(v, str) and pattern.search(v) for v in candidates(value)):
+                    return False
+            else:
+                raise OperationFailure(f"Operator {op} is not supported by the SQLite backend")
+        return True
+    if not found:
+        return cond is None
+    return any(v == cond for v in candidates(value))
+
+
+def matches(doc, flt):
+    for key, cond in (flt or {}).items():
+        if key == "$and":
+            if not all(matches(doc, sub) for sub in cond):
+                return False
+        elif key == "$or":
+            if not any(matches(doc, sub) for sub in cond):
+                return False
+        elif key == "$text":
+            raise OperationFailure("text search is not supported by the SQLite backend")
+        elif not match_condition(doc, key, cond):
+            return False
+    return True
+
+
+def is_scalar(value):
+    return value is None or isinstance(value, (str, int, float, bool, ObjectId, datetime))
+
+
+def translate(flt, multikey):
+    """Build a SQL pre-filter for the parts of `flt` that map onto indexed expressions.
+
+    Returns (where, params, exact); when exact is False the caller re-checks rows in Python.
+    """
+    clauses, params, exact = [], [], True
+    for key, cond in (flt or {}).items():
+        if key == "$or" and cond:
+            branches = [translate(sub, multikey) for sub in cond]
+            if all(branch_exact and where != "1" for where, _, branch_exact in branches):
+                clauses.append("(" + " OR ".join(f"({where})" for where, _, _ in branches) + ")")
+                for _, branch_params, _ in branches:
+                    params.extend(branch_params)
+                continue
+        if key.startswith("$") or key in multikey:
+            exact = False
+            continue
+        col = column(key)
+        if isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond):
+            for op, arg in cond.items():
+                sql_op = {"$eq": "=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}.get(op)
+                if sql_op and is_scalar(arg) and arg is not None and not isinstance(arg, bool):
+                    clauses.append(f"{col} {sql_op} ?")
+                    params.append(sql_param(key, arg))
+                elif op == "$in" and arg and all(is_scalar(a) and a is not None and not isinstance(a, bool) for a in arg):
+                    clauses.append(f"{col} IN ({', '.join('?' for _ in arg)})")
+                    params.extend(sql_param(key, a) for a in arg)
+                else:
+                    exact = False
+        elif is_scalar(cond) and cond is not None and not isinstance(cond, bool):
+            clauses.append(f"{col} = ?")
+            params.append(sql_param(key, cond))
+        else:
+            exact = False
+    return (" AND ".join(clauses) or "1"), params, exact
+
+
+def set_path(doc, field, value):
+    parts = field.split(".")
+    target = doc
+    for part in parts[:-1]:
+        target = target.setdefault(part, {})
+    target[parts[-1]] = value
+
+
+def unset_path(doc, field):
+    parts = field.split(".")
+    target = doc
+    for part in parts[:-1]:
+        target = target.get(part)
+        if not isinstance(target, dict):
+            return
+    target.pop(parts[-1], None)
+
+
+def apply_update(doc, update, inserting=False):
+    for op, fields in update.items():
+        for field, value in fields.items():
+            if op == "$set":
+                set_path(doc, field, value)
+            elif op == "$setOnInsert":
+                if inserting:
+                    set_path(doc, field, value)
+            elif op == "$unset":
+                unset_path(doc, field)
+            elif op == "$inc":
+                found, current = get_path(doc, field)
+                set_path(doc, field, (current if found and current is not None else 0) + value)
+            elif op == "$push":
+                found, current = get_path(doc, field)
+                set_path(doc, field, (list(current) if found and current else []) + [value])
+            elif op in ("$min", "$max"):
+                found, current = get_path(doc, field)
+                if not found or current is None or (value < current if op == "$min" else value > current):
+                    set_path(doc, field, value)
+            else:
+                raise OperationFailure(f"Update operator {op} is not supported by the SQLite backend")
+    return doc
+
+
+def project(doc, projection):
+    if not projection:
+        return doc
+    include = {k for k, v in projection.items() if v and k != "_id"}
+    if include:
+        out = {}
+        for k in include:
+            found, value = get_path(doc, k)
+            if found:
+                set_path(out, k, value)
+        if projection.get("_id", 1) and "_id" in doc:
+            out["_id"] = doc["_id"]
+        return out
+    return {k: v for k, v in doc.items() if projection.get(k, 1)}
+
+
+def seed_from_filter(flt):
+    doc = {}
+    for key, cond in (flt or {}).items():
+        if not key.startswith("$") and not (isinstance(cond, dict) and any(k.startswith("$") for k in cond)):
+            set_path(doc, key, cond)
+    return doc
+
+
+class Result:
+    def __init__(self, **fields):
+        self.acknowledged = True
+        self.inserted_id = None
+        self.inserted_ids = []
+        self.matched_count = 0
+        self.modified_count = 0
+        self.deleted_count = 0
+        self.upserted_id = None
+        self.__dict__.update(fields)
+
+
+class SQLiteEngine:
+    def __init__(self, path):
+        self.path = path
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self.conn = None
+        self.tables = set()
+        self.multikey = {}
+        self.ttl = {}
+        self.pending_writes = 0
+        self.commit_handle = None
+        self.ttl_checked = 0.0
+
+    async def run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    def open(self):
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=512)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=OFF")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS _meta (collection TEXT, kind TEXT, path TEXT, value REAL, PRIMARY KEY (collection, kind, path))")
+        for collection, kind, path, value in self.conn.execute("SELECT collection, kind, path, value FROM _meta"):
+            if kind == "multikey":
+                self.multikey.setdefault(collection, set()).add(path)
+            elif kind == "ttl":
+                self.ttl.setdefault(collection, {})[path] = value
+        for (name,) in self.conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'c\\_%' ESCAPE '\\'"):
+            self.tables.add(name[2:])
+        self.conn.commit()
+
+    def table(self, collection):
+        if collection not in self.tables:
+            self.conn.execute(f'CREATE TABLE IF NOT EXISTS "c_{collection}" (id TEXT PRIMARY KEY, doc TEXT NOT NULL)')
+            self.tables.add(collection)
+        return f'"c_{collection}"'
+
+    def note_multikey(self, collection, doc, prefix=""):
+        for key, value in doc.items():
+            path = prefix + key
+            if isinstance(value, list):
+                known = self.multikey.setdefault(collection, set())
+                if path not in known:
+                    known.add(path)
+                    self.conn.execute("INSERT OR IGNORE INTO _meta VALUES (?, 'multikey', ?, NULL)", (collection, path))
+            elif isinstance(value, dict) and not prefix:
+                self.note_multikey(collection, value, path + ".")
+
+    def wrote(self, count=1):
+        self.pending_writes += count
+        if self.pending_writes >= COMMIT_BATCH_SIZE:
+            self.commit()
+
+    def commit(self):
+        if self.pending_writes:
+            self.conn.commit()
+            self.pending_writes = 0
+        now = time.monotonic()
+        if self.ttl and now - self.ttl_checked >= TTL_INTERVAL_SECONDS:
+            self.ttl_checked = now
+            self.expire()
+
+    def expire(self):
+        removed = 0
+        for collection, paths in self.ttl.items():
+            table = self.table(collection)
+            for path, seconds in paths.items():
+                cutoff = encode(datetime.now(timezone.utc) - timedelta(seconds=seconds))
+                cur = self.conn.execute(f"DELETE FROM {table} WHERE {column(path)} < ?", (cutoff,))
+                removed += cur.rowcount
+        if removed:
+            self.conn.commit()
+
+    def schedule_commit(self):
+        if self.commit_handle is None:
+            loop = asyncio.get_running_loop()
+            self.commit_handle = loop.call_later(COMMIT_INTERVAL_SECONDS, self._commit_soon)
+
+    def _commit_soon(self):
+        self.commit_handle = None
+        asyncio.ensure_future(self.run(self.commit))
+
+    async def flush(self):
+        await self.run(self.commit)
+
+    async def close(self):
+        if self.commit_handle:
+            self.commit_handle.cancel()
+            self.commit_handle = None
+        await self.flush()
+        await self.run(self.conn.close)
+        self.executor.shutdown(wait=True)
+
+
+class SQLiteCursor:
+    def __init__(self, collection, flt, projection=None, sort=None, skip=0, limit=0):
+        self.collection = collection
+        self.filter = flt or {}
+        self.projection = projection
+        self._sort = list(sort or [])
+        self._skip = skip or 0
+        self._limit = limit or 0
+        self._items = None
+
+    def sort(self, key, direction=1):
+        if isinstance(key, list):
+            self._sort = list(key)
+        else:
+            self._sort = [(key, direction)]
+        return self
+
+    def skip(self, count):
+        self._skip = count
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    async def to_list(self, length=None):
+        limit = self._limit
+        if length:
+            limit = min(limit, length) if limit else length
+        return await self.collection.engine.run(self.collection._find, self.filter, self.projection, self._sort, self._skip, limit)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._items is None:
+            self._items = iter(await self.to_list())
+        try:
+            return next(self._items)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class SQLiteCollection:
+    def __init__(self, engine, name):
+        self.engine = engine
+        self.name = name
+
+    # -- synchronous helpers, always executed on the engine thread --
+
+    def _select(self, flt, sort=None, limit=0):
+        """Yield matching documents; with `limit`, stop after that many and, when SQL filters exactly, fetch no more."""
+        engine = self.engine
+        table = engine.table(self.name)
+        where, params, exact = translate(flt, engine.multikey.get(self.name, set()))
+        sql = f"SELECT doc FROM {table} WHERE {where}"
+        if sort:
+            sql += " ORDER BY " + ", ".join(f"{column(k)} {'DESC' if d == -1 else 'ASC'}" for k, d in sort)
+        if limit and exact:
+            sql += f" LIMIT {int(limit)}"
+        rows = engine.conn.execute(sql, params)
+        found = 0
+        for (raw,) in rows:
+            doc = decode(json.loads(raw))
+            if exact or matches(doc, flt):
+                yield doc
+                found += 1
+                if limit and found >= limit:
+                    return
+
+    def _find(self, flt, projection=None, sort=None, skip=0, limit=0):
+        return [project(doc, projection) for doc in self._select(flt, sort, skip + limit if limit else 0)][skip:]
+
+    def _write(self, doc, replace=False):
+        engine = self.engine
+        table = engine.table(self.name)
+        engine.note_multikey(self.name, doc)
+        verb = "INSERT OR REPLACE" if replace else "INSERT"
+        try:
+            engine.conn.execute(f"{verb} INTO {table} (id, doc) VALUES (?, ?)",
+                                (key_param(doc["_id"]), json.dumps(encode(doc), separators=(",", ":"))))
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} ({e})")
+
+    def _insert(self, docs):
+        ids = []
+        for doc in docs:
+            doc.setdefault("_id", ObjectId())
+            self._write(doc)
+            ids.append(doc["_id"])
+        self.engine.wrote(len(docs))
+        return ids
+
+    def _update(self, flt, update, upsert=False, many=False):
+        matched = modified = 0
+        targets = list(self._select(flt, limit=0 if many else 1))
+        for doc in targets:
+            matched += 1
+            before = json.dumps(encode(doc), sort_keys=True)
+            apply_update(doc, update)
+            if json.dumps(encode(doc), sort_keys=True) != before:
+                self._write(doc, replace=True)
+                modified += 1
+        upserted_id = None
+        if not targets and upsert:
+            doc = apply_update(seed_from_filter(flt), update, inserting=True)
+            doc.setdefault("_id", ObjectId())
+            self._write(doc)
+            upserted_id = doc["_id"]
+        self.engine.wrote(modified + (1 if upserted_id is not None else 0))
+        return Result(matched_count=matched, modified_count=modified, upserted_id=upserted_id)
+
+    def _find_one_and_update(self, flt, update, upsert, sort, return_after):
+        targets = list(self._find(flt, sort=sort, limit=1))
+        if not targets:
+            if not upsert:
+                return None
+            doc = apply_update(seed_from_filter(flt), update, inserting=True)
+            doc.setdefault("_id", ObjectId())
+            self._write(doc)
+            self.engine.wrote()
+            return doc if return_after else None
+        doc = targets[0]
+        before = copy.deepcopy(doc)
+        apply_update(doc, update)
+        self._write(doc, replace=True)
+        self.engine.wrote()
+        return doc if return_after else before
+
+    def _delete(self, flt, many=False):
+        table = self.engine.table(self.name)
+        ids = [key_param(doc["_id"]) for doc in self._select(flt, limit=0 if many else 1)]
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            self.engine.conn.execute(f"DELETE FROM {table} WHERE id IN ({', '.join('?' for _ in chunk)})", chunk)
+        self.engine.wrote(len(ids))
+        return Result(deleted_count=len(ids))
+
+    def _explain(self, flt, sort):
+        """EXPLAIN QUERY PLAN for a find, reported in the shape of a Mongo queryPlanner result."""
+        table = self.engine.table(self.name)
+        where, params, _ = translate(flt, self.engine.multikey.get(self.name, set()))
+        sql = f"SELECT doc FROM {table} WHERE {where}"
+        if sort:
+            sql += " ORDER BY " + ", ".join(f"{column(k)} {'DESC' if d == -1 else 'ASC'}" for k, d in sort)
+        stages = []
+        for row in self.engine.conn.execute("EXPLAIN QUERY PLAN " + sql, params):
+            detail = row[-1]
+            if detail.startswith(("SCAN", "SEARCH")):
+                stage = "IXSCAN" if "USING" in detail else "COLLSCAN"
+            elif detail.startswith("USE TEMP B-TREE"):
+                stage = "SORT"
+            else:
+                continue
+            stages.append({"stage": stage, "detail": detail})
+        return {"queryPlanner": {"winningPlan": {"stage": "FETCH", "inputStages": stages}}, "ok": 1}
+
+    def _count(self, flt):
+        return sum(1 for _ in self._select(flt))
+
+    def _create_index(self, keys, options):
+        engine = self.engine
+        table = engine.table(self.name)
+        if isinstance(keys, str):
+            keys = [(keys, 1)]
+        if any(direction == "text" for _, direction in keys):
+            raise OperationFailure("text indexes are not supported by the SQLite backend")
+        name = options.get("name") or "_".join(f"{k}_{d}" for k, d in keys)
+        index = f'"ix_{self.name}_{name}"'
+        exprs = ", ".join(f"{column(k)} {'DESC' if d == -1 else 'ASC'}" for k, d in keys)
+        unique = "UNIQUE " if options.get("unique") else ""
+        partial = f" WHERE {column(keys[0][0])} IS NOT NULL" if options.get("sparse") and options.get("unique") else ""
+        engine.conn.execute(f"CREATE {unique}INDEX IF NOT EXISTS {index} ON {table} ({exprs}){partial}")
+        if "expireAfterSeconds" in options:
+            engine.ttl.setdefault(self.name, {})[keys[0][0]] = options["expireAfterSeconds"]
+            engine.conn.execute("INSERT OR REPLACE INTO _meta VALUES (?, 'ttl', ?, ?)",
+                                (self.name, keys[0][0], options["expireAfterSeconds"]))
+        engine.conn.commit()
+        return name
+
+    def _drop_index(self, name):
+        self.engine.conn.execute(f'DROP INDEX IF EXISTS "ix_{self.name}_{name}"')
+        self.engine.conn.commit()
+
+    # -- Motor-compatible coroutine API --
+
+    def find(self, filter=None, projection=None, sort=None, skip=0, limit=0):
+        return SQLiteCursor(self, filter, projection, sort, skip, limit)
+
+    async def find_one(self, filter=None, projection=None, sort=None):
+        items = await self.engine.run(self._find, filter or {}, projection, sort, 0, 1)
+        return items[0] if items else None
+
+    async def insert_one(self, document):
+        ids = await self.engine.run(self._insert, [document])
+        self.engine.schedule_commit()
+        return Result(inserted_id=ids[0])
+
+    async def insert_many(self, documents):
+        ids = await self.engine.run(self._insert, list(documents))
+        self.engine.schedule_commit()
+        return Result(inserted_ids=ids)
+
+    async def update_one(self, filter, update, upsert=False):
+        result = await self.engine.run(self._update, filter, update, upsert, False)
+        self.engine.schedule_commit()
+        return result
+
+    async def update_many(self, filter, update, upsert=False):
+        result = await self.engine.run(self._update, filter, update, upsert, True)
+        self.engine.schedule_commit()
+        return result
+
+    async def find_one_and_update(self, filter, update, upsert=False, sort=None, return_document=False):
+        doc = await self.engine.run(self._find_one_and_update, filter, update, upsert, sort, bool(return_document))
+        self.engine.schedule_commit()
+        return doc
+
+    async def delete_one(self, filter):
+        result = await self.engine.run(self._delete, filter, False)
+        self.engine.schedule_commit()
+        return result
+
+    async def delete_many(self, filter):
+        result = await self.engine.run(self._delete, filter, True)
+        self.engine.schedule_commit()
+        return result
+
+    async def count_documents(self, filter):
+        return await self.engine.run(self._count, filter or {})
+
+    async def create_index(self, keys, **options):
+        return await self.engine.run(self._create_index, keys, options)
+
+    async def drop_index(self, name):
+        await self.engine.run(self._drop_index, name)
+
+
+class SQLiteDatabase:
+    def __init__(self, engine):
+        self.engine = engine
+        self.collections = {}
+
+    def __getitem__(self, name):
+        if name not in self.collections:
+            self.collections[name] = SQLiteCollection(self.engine, name)
+        return self.collections[name]
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def with_options(self, **kwargs):
+        return self
+
+    async def command(self, name, *args, **kwargs):
+        if name == "ping":
+            return {"ok": 1}
+        if name == "explain" and args:
+            spec = args[0]
+            collection = self[spec["find"]]
+            return await self.engine.run(collection._explain, spec.get("filter", {}), list(spec.get("sort", {}).items()))
+        raise OperationFailure(f"Command {name} is not supported by the SQLite backend")
+
+
+async def open_database(path):
+    engine = SQLiteEngine(path)
+    await engine.run(engine.open)
+    return SQLiteDatabase(engine)
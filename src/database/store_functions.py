@@ -1,125 +1,376 @@
+import itertools
+import os
+import re
 import time
-import uuid
-from src.database.database import get_db
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+from src.database.database import get_db, get_history_db
+from src.database.indexes import TEXT_INDEX, ensure_indexes
+from src.utils.cache import response_cache
+
+text_index_ready = False
+
+# API field name -> stored (compact) path. Unset values are omitted from the document entirely.
+FIELD_PATHS = {
+    "source": "s",
+    "text": "t",
+    "username": "u",
+    "timestamp": "ts",
+    "tg_msg_id": "p.tg",
+    "dc_msg_id": "p.dc",
+    "slack_ts": "p.sk",
+    "reply_to_id": "r",
+    "reply_to_tg_id": "rp.tg",
+    "reply_to_dc_id": "rp.dc",
+    "reply_to_slack_ts": "rp.sk",
+    "thread_root": "tr",
+    "attachments": "a",
+    "reactions": "rx",
+}
+# Fields holding internal message ids, stored as ObjectId and exposed as strings
+ID_FIELDS = {"reply_to_id", "thread_root"}
+
+MESSAGE_FIELDS = set(FIELD_PATHS)
+
+
+# Same layout as ObjectId (seconds, per-process random, counter), so synthesized ids keep insertion order within a second
+_ID_PROCESS = os.urandom(5)
+_id_counter = itertools.count(int.from_bytes(os.urandom(3), "big"))
+
+
+def new_id(timestamp=None):
+    """Time-ordered id; an explicit timestamp (a platform message's own time, migration) sorts it where it belongs."""
+    if timestamp is None:
+        return ObjectId()
+    counter = next(_id_counter) % 0x1000000
+    return ObjectId(int(timestamp).to_bytes(4, "big") + _ID_PROCESS + counter.to_bytes(3, "big"))
+
+
+def parse_id(value):
+    """Accept an id as given by API clients: ObjectId hex, or a legacy UUID string kept as-is."""
+    if isinstance(value, str) and ObjectId.is_valid(value):
+        return ObjectId(value)
+    return value
+
+
+def id_filter(internal_id):
+    oid = parse_id(internal_id)
+    if isinstance(oid, ObjectId):
+        return {"_id": oid}
+    # Ids handed out before the compact schema live on as `lid` after migration
+    return {"$or": [{"_id": oid}, {"lid": oid}]}
+
+
+def compact(fields):
+    """Build a stored document from API-named fields, dropping unset values."""
+    doc = {}
+    for name, value in fields.items():
+        if value is None:
+            continue
+        path = FIELD_PATHS[name]
+        if "." in path:
+            parent, child = path.split(".")
+            doc.setdefault(parent, {})[child] = value
+        else:
+            doc[path] = value
+    return doc
+
+
+def projection(fields):
+    if not fields:
+        return None
+    return {FIELD_PATHS[f]: 1 for f in fields if f in FIELD_PATHS}
+
 
 def api_shape(d):
     if not d:
         return None
-    d = dict(d)
-    d["id"] = str(d.pop("_id"))
-    return d
+    shaped = {}
+    for name, path in FIELD_PATHS.items():
+        if "." in path:
+            parent, child = path.split(".")
+            value = (d.get(parent) or {}).get(child)
+        else:
+            value = d.get(path)
+        if value is None:
+            continue
+        shaped[name] = str(value) if name in ID_FIELDS else value
+    shaped["id"] = str(d["_id"])
+    return shaped
 
 
 async def configure():
-    db = get_db()
-    col = db["messages"]
-    await col.create_index("timestamp")
-    await col.create_index("tg_msg_id", sparse=True)
-    await col.create_index("dc_msg_id", sparse=True)
-    await col.create_index("slack_ts", sparse=True)
+    global text_index_ready
+    created = await ensure_indexes()
+    text_index_ready = ("messages", TEXT_INDEX) in created
 
-async def add_message(source, text, username=None, tg_msg_id=None, dc_msg_id=None, slack_ts=None, reply_to_tg_id=None, reply_to_dc_id=None, reply_to_slack_ts=None, reply_to_id=None,timestamp=None):
+async def add_message(source, text, username=None, tg_msg_id=None, dc_msg_id=None, slack_ts=None, reply_to_tg_id=None, reply_to_dc_id=None, reply_to_slack_ts=None, reply_to_id=None,timestamp=None, attachments=None):
+    """Store a message and return its id, or None when a message with the same platform id is already stored."""
     db = get_db()
     col = db["messages"]
-    doc = {
-        "_id": str(uuid.uuid4()),
+    # Without a timestamp (API messages) a plain ObjectId is used, whose counter keeps a second's messages in order
+    internal_id = new_id(timestamp)
+    timestamp = float(timestamp or time.time())
+    thread_root = internal_id
+    parent_id = None
+    if reply_to_id:
+        parent = await col.find_one(id_filter(reply_to_id), {"tr": 1})
+        if parent:
+            parent_id = parent["_id"]
+            thread_root = parent.get("tr") or parent["_id"]
+    doc = compact({
         "source": source,
         "text": text,
         "username": username,
-        "timestamp": float(timestamp or time.time()),
+        "timestamp": timestamp,
         "tg_msg_id": tg_msg_id,
         "slack_ts": slack_ts,
         "dc_msg_id": dc_msg_id,
-        "reply_to_id": reply_to_id,
+        "reply_to_id": parent_id or parse_id(reply_to_id),
         "reply_to_tg_id": reply_to_tg_id,
         "reply_to_slack_ts": reply_to_slack_ts,
         "reply_to_dc_id": reply_to_dc_id,
-    }
-    await col.insert_one(doc)
-    return doc["_id"]
+        "thread_root": thread_root,
+        "attachments": attachments,
+    })
+    doc["_id"] = internal_id
+    try:
+        await col.insert_one(doc)
+    except DuplicateKeyError:
+        # The live handler and backfill raced for the same message; whoever stored it first relays it
+        return None
+    response_cache.invalidate()
+    return str(internal_id)
 
 
-async def list_messages(limit=50, offset=0):
-    db = get_db()
+MAX_ID_TIMESTAMP = 0xFFFFFFFF
+
+
+def id_before(timestamp):
+    """Smallest id a message stored at `timestamp` can have, for time-range filters on `_id`."""
+    # ObjectIds hold an unsigned 32-bit timestamp (1970 to 2106)
+    seconds = min(max(int(timestamp), 0), MAX_ID_TIMESTAMP)
+    return ObjectId(seconds.to_bytes(4, "big") + bytes(8))
+
+
+async def list_messages(limit=50, offset=0, fields=None, before=None, history=True):
+    db = get_history_db() if history else get_db()
     col = db["messages"]
-    cursor = col.find({}, sort=[("timestamp", -1)], skip=offset)
+    # _id is time-ordered, so the primary key index serves both the sort and the `before` cursor
+    flt = {}
+    if before:
+        flt["_id"] = {"$lt": parse_id(before)}
+    cursor = col.find(flt, projection(fields), sort=[("_id", -1)], skip=offset)
     items = await cursor.to_list(length=limit)
     return [api_shape(d) for d in items]
 
 
-async def get_message(internal_id):
-    db = get_db()
+def search_filter(query=None, source=None, username=None, since=None, until=None):
+    flt = {}
+    if query:
+        if text_index_ready:
+            flt["$text"] = {"$search": query}
+        else:
+            # Same fields as the text index, so a query finds the same messages on either path
+            pattern = {"$regex": re.escape(query), "$options": "i"}
+            flt["$or"] = [{"t": pattern}, {"u": pattern}]
+    if source:
+        flt["s"] = source
+    if username:
+        flt["u"] = username
+    if since is not None or until is not None:
+        # The _id bounds let the range ride the (field, _id) indexes; ts keeps sub-second precision
+        flt["ts"] = {}
+        flt["_id"] = {}
+        if since is not None:
+            flt["ts"]["$gte"] = float(since)
+            flt["_id"]["$gte"] = id_before(since)
+        if until is not None:
+            flt["ts"]["$lte"] = float(until)
+            flt["_id"]["$lt"] = id_before(until + 1)
+    return flt
+
+
+async def search_messages(query=None, source=None, username=None, since=None, until=None, limit=50, fields=None):
+    db = get_history_db()
     col = db["messages"]
-    d = await col.find_one({"_id": internal_id})
+    flt = search_filter(query, source, username, since, until)
+    cursor = col.find(flt, projection(fields), sort=[("_id", -1)], limit=limit)
+    items = await cursor.to_list(length=limit)
+    return [api_shape(d) for d in items]
+
+
+async def get_message(internal_id, fields=None, history=False):
+    db = get_history_db() if history else get_db()
+    col = db["messages"]
+    d = await col.find_one(id_filter(internal_id), projection(fields))
     return api_shape(d)
 
 
+async def get_thread(internal_id):
+    db = get_history_db()
+    col = db["messages"]
+    d = await col.find_one(id_filter(internal_id))
+    if not d:
+        return None
+    root = d.get("tr") or d["_id"]
+    cursor = col.find({"$or": [{"tr": root}, {"_id": root}]}, sort=[("_id", 1)])
+    items = await cursor.to_list(length=None)
+    by_id = {m["_id"]: m for m in items}
+
+    ancestors = []
+    seen = {d["_id"]}
+    parent_id = d.get("r")
+    while parent_id and parent_id in by_id and parent_id not in seen:
+        seen.add(parent_id)
+        ancestors.append(by_id[parent_id])
+        parent_id = by_id[parent_id].get("r")
+    ancestors.reverse()
+
+    children = {}
+    for m in items:
+        if m.get("r"):
+            children.setdefault(m["r"], []).append(m)
+    descendants = []
+    stack = [d["_id"]]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            if child["_id"] not in seen:
+                seen.add(child["_id"])
+                descendants.append(child)
+                stack.append(child["_id"])
+    descendants.sort(key=lambda m: m["_id"])
+
+    return {
+        "thread_root": str(root),
+        "ancestors": [api_shape(m) for m in ancestors],
+        "message": api_shape(d),
+        "descendants": [api_shape(m) for m in descendants],
+    }
+
+
+async def set_text(internal_id, text):
+    db = get_db()
+    col = db["messages"]
+    await col.update_one(id_filter(internal_id), {"$set": {"t": text}})
+    response_cache.invalidate()
+
+
+async def delete_message(internal_id):
+    db = get_db()
+    col = db["messages"]
+    await col.delete_one(id_filter(internal_id))
+    response_cache.invalidate()
+
+
+async def add_reactions(internal_id, source, deltas):
+    """Increment per-platform reaction counts, e.g. deltas={"👍": 2, "🎉": -1}."""
+    db = get_db()
+    col = db["messages"]
+    await col.update_one(id_filter(internal_id), {"$inc": {f"rx.{source}.{e}": c for e, c in deltas.items()}})
+    response_cache.invalidate()
+
+
+async def set_reactions(internal_id, source, counts):
+    db = get_db()
+    col = db["messages"]
+    await col.update_one(id_filter(internal_id), {"$set": {f"rx.{source}": counts}})
+    response_cache.invalidate()
+
+
+async def last_platform_id(field):
+    """Highest stored id for a platform link field (tg_msg_id, dc_msg_id or slack_ts), mirrored copies included."""
+    db = get_db()
+    col = db["messages"]
+    path = FIELD_PATHS[field]
+    d = await col.find_one({path: {"$exists": True}}, {path: 1}, sort=[(path, -1)])
+    if not d:
+        return None
+    parent, child = path.split(".")
+    return d[parent][child]
+
+
 async def find_by_tg_id(tg_msg_id):
     db = get_db()
     col = db["messages"]
-    d = await col.find_one({"tg_msg_id": tg_msg_id})
+    d = await col.find_one({"p.tg": tg_msg_id})
     return api_shape(d)
 
 
 async def find_by_dc_id(dc_msg_id):
     db = get_db()
     col = db["messages"]
-    d = await col.find_one({"dc_msg_id": dc_msg_id})
+    d = await col.find_one({"p.dc": dc_msg_id})
     return api_shape(d)
 
 
 async def set_dc_id_for_tg(tg_msg_id, dc_msg_id):
     db = get_db()
     col = db["messages"]
-    await col.update_many({"tg_msg_id": tg_msg_id}, {"$set": {"dc_msg_id": dc_msg_id}})
+    await col.update_many({"p.tg": tg_msg_id}, {"$set": {"p.dc": dc_msg_id}})
+    response_cache.invalidate()
 
 
 async def set_tg_id_for_dc(dc_msg_id, tg_msg_id):
     db = get_db()
     col = db["messages"]
-    await col.update_many({"dc_msg_id": dc_msg_id}, {"$set": {"tg_msg_id": tg_msg_id}})
+    await col.update_many({"p.dc": dc_msg_id}, {"$set": {"p.tg": tg_msg_id}})
+    response_cache.invalidate()
 
 
 async def set_tg_msg_id(internal_id, tg_msg_id):
     db = get_db()
     col = db["messages"]
-    await col.update_one({"_id": internal_id}, {"$set": {"tg_msg_id": tg_msg_id}})
+    await col.update_one(id_filter(internal_id), {"$set": {"p.tg": tg_msg_id}})
+    response_cache.invalidate()
 
 
 async def set_dc_msg_id(internal_id, dc_msg_id):
     db = get_db()
     col = db["messages"]
-    await col.update_one({"_id": internal_id}, {"$set": {"dc_msg_id": dc_msg_id}})
+    await col.update_one(id_filter(internal_id), {"$set": {"p.dc": dc_msg_id}})
+    response_cache.invalidate()
 
 
 async def find_by_slack_ts(slack_ts):
     db = get_db()
     col = db["messages"]
-    d = await col.find_one({"slack_ts": slack_ts})
+    d = await col.find_one({"p.sk": slack_ts})
     return api_shape(d)
 
 
+async def set_slack_ts(internal_id, slack_ts):
+    db = get_db()
+    col = db["messages"]
+    await col.update_one(id_filter(internal_id), {"$set": {"p.sk": slack_ts}})
+    response_cache.invalidate()
+
+
 async def set_slack_ts_for_dc(dc_msg_id, slack_ts):
     db = get_db()
     col = db["messages"]
-    await col.update_many({"dc_msg_id": dc_msg_id}, {"$set": {"slack_ts": slack_ts}})
+    await col.update_many({"p.dc": dc_msg_id}, {"$set": {"p.sk": slack_ts}})
+    response_cache.invalidate()
 
 
 async def set_slack_ts_for_tg(tg_msg_id, slack_ts):
     db = get_db()
     col = db["messages"]
-    await col.update_many({"tg_msg_id": tg_msg_id}, {"$set": {"slack_ts": slack_ts}})
+    await col.update_many({"p.tg": tg_msg_id}, {"$set": {"p.sk": slack_ts}})
+    response_cache.invalidate()
 
 
 async def set_dc_id_for_slack(slack_ts, dc_msg_id):
     db = get_db()
     col = db["messages"]
-    await col.update_many({"slack_ts": slack_ts}, {"$set": {"dc_msg_id": dc_msg_id}})
+    await col.update_many({"p.sk": slack_ts}, {"$set": {"p.dc": dc_msg_id}})
+    response_cache.invalidate()
 
 
 async def set_tg_id_for_slack(slack_ts, tg_msg_id):
     db = get_db()
     col = db["messages"]
-    await col.update_many({"slack_ts": slack_ts}, {"$set": {"tg_msg_id": tg_msg_id}})
+    await col.update_many({"p.sk": slack_ts}, {"$set": {"p.tg": tg_msg_id}})
+    response_cache.invalidate()
 
 
@@ -1,5 +1,13 @@
+import logging
+import discord
+from src.utils import media
 from src.utils.misc import TG_TAG, DC_TAG, SLACK_TAG
 
+logger = logging.getLogger(__name__)
+
+# Telegram rejects longer media captions
+TG_CAPTION_LIMIT = 1024
+
 
 def istg(text):
     return text.startswith(TG_TAG)
@@ -34,7 +42,7 @@ def skformat(username, text):
 async def fwd_to_dd(dbot, channel_id, message):
     channel = dbot.get_channel(channel_id)
     if not channel:
-        print(f"Discord channel not found: {channel_id}")
+        logger.warning("Discord channel not found: %s", channel_id)
         return
     await channel.send(message)
 
@@ -44,25 +52,65 @@ async def fwd_tg(tg_client, chat_id, message):
     await tg_client.send_message(chat_id, message)
 
 
-async def fwd_dd_with_reply(dbot, channel_id, message, message_id=None):
+async def fwd_dd_with_reply(dbot, channel_id, message, message_id=None, files=None):
     channel = dbot.get_channel(channel_id)
     if not channel:
-        print(f"Discord channel not found: {channel_id}")
+        logger.warning("Discord channel not found: %s", channel_id)
         return None
 
+    # discord.File streams from the open file handle during upload
+    kwargs = {"files": [discord.File(f.path, filename=f.name) for f in files]} if files else {}
     if message_id:
         try:
             ref_msg = await channel.fetch_message(message_id)
-            sent = await ref_msg.reply(message)
+            sent = await ref_msg.reply(message, **kwargs)
         except:
-            sent = await channel.send(message)
+            if files:
+                kwargs = {"files": [discord.File(f.path, filename=f.name) for f in files]}
+            sent = await channel.send(message, **kwargs)
     else:
-        sent = await channel.send(message)
+        sent = await channel.send(message, **kwargs)
     return getattr(sent, "id", None)
 
 
-async def fwd_to_tg_rply(tg_client, chat_id, message, msg_id=None):
+async def send_tg_file(tg_client, chat_id, f, caption=None, reply_to=None):
+    """Send a spooled file, reusing the media of an earlier upload of the same content when cached."""
+    ref = media.cache.upload_ref(f, "tg") if media.cache else None
+    if ref is not None:
+        try:
+            return await tg_client.send_file(chat_id, ref, caption=caption, reply_to=reply_to)
+        except Exception as e:
+            # File references expire; fall back to uploading the bytes again
+            logger.info("Cached Telegram upload for %s not reusable: %s", f.name, e)
+            media.cache.forget_upload(f, "tg")
+    sent = await tg_client.send_file(chat_id, f.path, caption=caption, reply_to=reply_to)
+    if media.cache and sent is not None:
+        media.cache.remember_upload(f, "tg", sent.media)
+    return sent
+
+
+def caption_header(message):
+    """The "[XX] name:" part of a relayed message, so every file of it carries the bridge tag."""
+    header = message.split(": ", 1)[0] + ":" if ": " in message else message
+    return header[:TG_CAPTION_LIMIT]
+
+
+async def fwd_to_tg_rply(tg_client, chat_id, message, msg_id=None, files=None):
     """Send message to Telegram with optional reply using Telethon client"""
+    if files:
+        if len(message) > TG_CAPTION_LIMIT:
+            # Too long for a caption: the text goes first and the files reply to it
+            sent = await tg_client.send_message(chat_id, message, reply_to=msg_id)
+            rest = files
+        else:
+            # The first file carries the text as its caption; Telethon uploads from disk in parts
+            sent = await send_tg_file(tg_client, chat_id, files[0], caption=message, reply_to=msg_id)
+            rest = files[1:]
+        # Tagged like the text, so the bridge doesn't take its own sends for new Telegram messages
+        header = caption_header(message)
+        for f in rest:
+            await send_tg_file(tg_client, chat_id, f, caption=header, reply_to=sent.id if sent else msg_id)
+        return sent.id if sent else None
     sent = await tg_client.send_message(
         chat_id,
         message,
@@ -71,6 +119,39 @@ async def fwd_to_tg_rply(tg_client, chat_id, message, msg_id=None):
     return sent.id if sent else None
 
 
-async def fwd_to_slack(slack_bot, message, slack_ts=None):
-    return await slack_bot.send_message(message, reply_to_slack_ts=slack_ts)
+async def fwd_to_slack(slack_bot, message, slack_ts=None, files=None):
+    return await slack_bot.send_message(message, reply_to_slack_ts=slack_ts, files=files)
+
+
+
+async def edit_tg(tg_client, chat_id, msg_id, message):
+    await tg_client.edit_message(chat_id, msg_id, message)
+
+
+async def delete_tg(tg_client, chat_id, msg_id):
+    await tg_client.delete_messages(chat_id, [msg_id])
+
+
+async def edit_dd(dbot, channel_id, message_id, message):
+    channel = dbot.get_channel(channel_id)
+    if not channel:
+        logger.warning("Discord channel not found: %s", channel_id)
+        return
+    # A partial message edits by id without fetching it first
+    await channel.get_partial_message(message_id).edit(content=message)
+
+
+async def delete_dd(dbot, channel_id, message_id):
+    channel = dbot.get_channel(channel_id)
+    if not channel:
+        logger.warning("Discord channel not found: %s", channel_id)
+        return
+    await channel.get_partial_message(message_id).delete()
+
+
+async def edit_slack(slack_bot, slack_ts, message):
+    await slack_bot.edit_message(slack_ts, message)
+
 
+async def delete_slack(slack_bot, slack_ts):
+    await slack_bot.delete_message(slack_ts)
@@ -0,0 +1,43 @@
+import hashlib
+from collections import OrderedDict
+from src.utils.serialize import dumps
+
+
+class ResponseCache:
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.generation = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, payload, generation):
+        body = dumps(payload)
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        entry = (etag, body)
+        # A write landed while this payload was being read; serve it once but don't keep it
+        if generation != self.generation:
+            return entry
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return entry
+
+    def invalidate(self):
+        self.generation += 1
+        self.entries.clear()
+
+
+def etag_matches(etag, if_none_match):
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+response_cache = ResponseCache()
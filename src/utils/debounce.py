@@ -0,0 +1,55 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Debouncer:
+    """Coalesce calls per key: only the latest action scheduled within `delay` runs.
+
+    Runs are also spaced `min_interval` apart, so a burst across many keys stays under the target's rate limit.
+    """
+
+    def __init__(self, delay, min_interval=0.0):
+        self.delay = delay
+        self.min_interval = min_interval
+        self.pending = {}
+        self.timers = {}
+        self.next_slot = 0.0
+
+    def schedule(self, key, action):
+        """Queue `action` (a zero-argument coroutine function) for `key`, replacing any queued one."""
+        self.pending[key] = action
+        if key not in self.timers:
+            self.timers[key] = asyncio.create_task(self._run(key))
+
+    async def _run(self, key):
+        try:
+            await asyncio.sleep(self.delay)
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            wait = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.min_interval
+            if wait > 0:
+                await asyncio.sleep(wait)
+        finally:
+            self.timers.pop(key, None)
+        # Popped after the wait so edits that arrive while queued still collapse into this run
+        action = self.pending.pop(key, None)
+        if action is not None:
+            try:
+                await action()
+            except Exception as e:
+                logger.error("Debounced action for %s failed: %s", key, e)
+
+    async def flush(self):
+        """Run everything still queued right away (used on shutdown)."""
+        for task in list(self.timers.values()):
+            task.cancel()
+        self.timers.clear()
+        batch, self.pending = self.pending, {}
+        for key, action in batch.items():
+            try:
+                await action()
+            except Exception as e:
+                logger.error("Debounced action for %s failed: %s", key, e)
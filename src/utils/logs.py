@@ -0,0 +1,37 @@
+import logging
+import logging.handlers
+import queue
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+listener = None
+
+
+def setup_logging(level="INFO", log_file="bridge.log"):
+    """Route all records through a queue so file/stream I/O happens off the event loop."""
+    global listener
+    if listener:
+        return listener
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+
+    root = logging.getLogger()
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(level)
+    listener.start()
+    return listener
+
+
+def stop_logging():
+    global listener
+    if listener:
+        listener.stop()
+        listener = None
@@ -0,0 +1,246 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+ENABLED = True
+MAX_BYTES = 25 * 1024 * 1024
+MAX_TRANSFERS = 3
+# Multiple of 4 KiB and at most 512 KiB, as Telethon's iter_download requires
+CHUNK_SIZE = 256 * 1024
+TEMP_DIR = None
+
+transfers = asyncio.Semaphore(MAX_TRANSFERS)
+cache = None
+
+
+class TooLarge(Exception):
+    pass
+
+
+class Attachment:
+    """A file on the source platform; `open()` returns an async iterator of byte chunks.
+
+    `key` is a stable source-side id (e.g. a Telegram document id) that lets the cache skip the download.
+    """
+
+    def __init__(self, name, size, mime, open, key=None):
+        self.name = name or "file"
+        self.size = size
+        self.mime = mime
+        self.open = open
+        self.key = key
+
+    def describe(self):
+        return {"name": self.name, "size": self.size, "mime": self.mime}
+
+
+class SpooledFile:
+    def __init__(self, name, size, mime, path, digest=None):
+        self.name = name
+        self.size = size
+        self.mime = mime
+        self.path = path
+        self.digest = digest
+
+
+class MediaCache:
+    """Content-addressed files under `root/<digest>/<name>`, evicted least recently used past `max_bytes`."""
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.keys = {}
+        self.uploads = {}
+        self.pins = {}
+        self.size = 0
+
+    def load(self):
+        os.makedirs(self.root, exist_ok=True)
+        found = []
+        for digest in os.listdir(self.root):
+            folder = os.path.join(self.root, digest)
+            if digest.startswith("tmp") or not os.path.isdir(folder):
+                shutil.rmtree(folder, ignore_errors=True)
+                continue
+            names = os.listdir(folder)
+            if not names:
+                shutil.rmtree(folder, ignore_errors=True)
+                continue
+            path = os.path.join(folder, names[0])
+            stat = os.stat(path)
+            found.append((stat.st_mtime, SpooledFile(names[0], stat.st_size, None, path, digest)))
+        for _, f in sorted(found, key=lambda item: item[0]):
+            self.entries[f.digest] = f
+            self.size += f.size
+        self.evict()
+
+    def lookup(self, key):
+        digest = self.keys.get(key) if key else None
+        f = self.entries.get(digest) if digest else None
+        if f is None:
+            return None
+        self.entries.move_to_end(digest)
+        return f
+
+    def add(self, key, tmp_path, name, size, mime, digest):
+        """Move a freshly spooled file into the cache, or drop it if the same content is already there."""
+        f = self.entries.get(digest)
+        if f is None:
+            folder = os.path.join(self.root, digest)
+            os.makedirs(folder, exist_ok=True)
+            path = os.path.join(folder, safe_name(name))
+            os.replace(tmp_path, path)
+            f = self.entries[digest] = SpooledFile(os.path.basename(path), size, mime, path, digest)
+            self.size += size
+        else:
+            os.remove(tmp_path)
+            self.entries.move_to_end(digest)
+        shutil.rmtree(os.path.dirname(tmp_path), ignore_errors=True)
+        if key:
+            self.keys[key] = digest
+        return f
+
+    def pin(self, f):
+        self.pins[f.digest] = self.pins.get(f.digest, 0) + 1
+
+    def unpin(self, f):
+        count = self.pins.get(f.digest, 0) - 1
+        if count > 0:
+            self.pins[f.digest] = count
+        else:
+            self.pins.pop(f.digest, None)
+
+    def evict(self):
+        for digest in list(self.entries):
+            if self.size <= self.max_bytes:
+                break
+            # Files still being uploaded stay until a later eviction
+            if digest in self.pins:
+                continue
+            f = self.entries.pop(digest)
+            self.size -= f.size
+            self.uploads.pop(digest, None)
+            shutil.rmtree(os.path.dirname(f.path), ignore_errors=True)
+        self.keys = {k: d for k, d in self.keys.items() if d in self.entries}
+
+    def upload_ref(self, f, platform):
+        """A platform-side handle from an earlier upload of the same content, if the platform allows reuse."""
+        if not f.digest:
+            return None
+        return self.uploads.get(f.digest, {}).get(platform)
+
+    def remember_upload(self, f, platform, ref):
+        if f.digest in self.entries and ref is not None:
+            self.uploads.setdefault(f.digest, {})[platform] = ref
+
+    def forget_upload(self, f, platform):
+        self.uploads.get(f.digest, {}).pop(platform, None)
+
+
+def configure(enabled=None, max_bytes=None, max_transfers=None, temp_dir=None, cache_dir=None, cache_max_bytes=None):
+    global ENABLED, MAX_BYTES, MAX_TRANSFERS, TEMP_DIR, transfers, cache
+    if enabled is not None:
+        ENABLED = enabled
+    if max_bytes:
+        MAX_BYTES = max_bytes
+    if max_transfers:
+        MAX_TRANSFERS = max_transfers
+        transfers = asyncio.Semaphore(max_transfers)
+    if temp_dir:
+        TEMP_DIR = temp_dir
+    if cache_dir and cache_max_bytes:
+        cache = MediaCache(cache_dir, cache_max_bytes)
+        cache.load()
+
+
+def safe_name(name):
+    name = re.sub(r"[^\w.\- ]", "_", os.path.basename(name)).strip(" .")
+    return name[:120] or "file"
+
+
+async def http_chunks(url, headers=None):
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url, headers=headers) as resp:
+            resp.raise_for_status()
+            async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                yield chunk
+
+
+async def spool(attachment):
+    """Stream an attachment to a temp file chunk by chunk, giving up once it passes MAX_BYTES."""
+    # Spool inside the cache root so the finished file can be renamed into place
+    folder = tempfile.mkdtemp(prefix="tmp" if cache else "bindsync-", dir=cache.root if cache else TEMP_DIR)
+    path = os.path.join(folder, safe_name(attachment.name))
+    digest = hashlib.blake2b(digest_size=16)
+    size = 0
+    try:
+        with open(path, "wb") as f:
+            async for chunk in attachment.open():
+                size += len(chunk)
+                if size > MAX_BYTES:
+                    raise TooLarge(attachment.name)
+                digest.update(chunk)
+                await asyncio.to_thread(f.write, chunk)
+    except BaseException:
+        shutil.rmtree(folder, ignore_errors=True)
+        raise
+    if cache:
+        return cache.add(attachment.key, path, attachment.name, size, attachment.mime, digest.hexdigest())
+    return SpooledFile(os.path.basename(path), size, attachment.mime, path)
+
+
+@asynccontextmanager
+async def relay(attachments):
+    """Spool `attachments` once for every destination; yields (files, skipped) and releases the files afterwards."""
+    if not attachments or not ENABLED:
+        yield [], list(attachments or [])
+        return
+    files, skipped = [], []
+    try:
+        # Only the downloads count against MAX_TRANSFERS; the uploads to each destination happen after release
+        async with transfers:
+            for attachment in attachments:
+                if attachment.size and attachment.size > MAX_BYTES:
+                    skipped.append(attachment)
+                    continue
+                f = cache.lookup(attachment.key) if cache else None
+                if f is None:
+                    try:
+                        f = await spool(attachment)
+                    except TooLarge:
+                        skipped.append(attachment)
+                        continue
+                    except Exception as e:
+                        logger.error("Failed to download attachment %s: %s", attachment.name, e)
+                        skipped.append(attachment)
+                        continue
+                if cache:
+                    cache.pin(f)
+                files.append(f)
+        yield files, skipped
+    finally:
+        for f in files:
+            if cache:
+                cache.unpin(f)
+            else:
+                shutil.rmtree(os.path.dirname(f.path), ignore_errors=True)
+        if cache:
+            cache.evict()
+
+
+def skipped_note(skipped):
+    """Text appended to a relayed message for attachments that were not transferred."""
+    if not skipped:
+        return ""
+    names = ", ".join(a.name for a in skipped)
+    return f"\n[attachment not relayed: {names}]"
@@ -20,23 +20,29 @@ class BindSyncTester:
             await self.session.close()
 
     async def test_health_check(self) -> Dict[str, Any]:
-        print("🔍 Testing health check endpoint...")
+        print("🔍 Testing health check endpoints...")
         try:
-            async with self.session.get(f"{self.base_url}/health") as response:
-                if response.status == 200:
+            async with self.session.get(f"{self.base_url}/healthz") as response:
+                if response.status != 200:
+                    print(f"❌ Liveness check failed with status: {response.status}")
+                    return {"error": f"HTTP {response.status}", "response": await response.text()}
+                live = await response.json()
+                print(f"✅ Alive (uptime {live.get('uptime_seconds')}s)")
+
+            # /readyz answers 503 with the same body while a dependency is down
+            async with self.session.get(f"{self.base_url}/readyz") as response:
+                if response.status in (200, 503):
                     data = await response.json()
-                    print("✅ Health check successful!")
                     print(f"   Status: {data.get('status')}")
-                    print(f"   Version: {data.get('version')}")
-                    runtime = data.get('runtime', {})
-                    print(f"   Runtime:")
-                    print(f"      - Telegram Bot: {'✅' if runtime.get('telegram_bot') else '❌'}")
-                    print(f"      - Discord Bot: {'✅' if runtime.get('discord_bot') else '❌'}")
-                    print(f"      - Slack Bot: {'✅' if runtime.get('slack_bot') else '❌'}")
-                    print(f"      - API Configured: {'✅' if runtime.get('api_configured') else '❌'}")
+                    print(f"   Checks:")
+                    for name, check in data.get('checks', {}).items():
+                        detail = f" ({check['latency_ms']} ms)" if 'latency_ms' in check else ""
+                        print(f"      - {name}: {'✅' if check.get('ok') else '❌'}{detail}")
+                    queues = data.get('queues', {})
+                    print(f"   Queues: in flight {queues.get('in_flight', 0)}, outbox {queues.get('outbox', {})}")
                     return data
                 else:
-                    print(f"❌ Health check failed with status: {response.status}")
+                    print(f"❌ Readiness check failed with status: {response.status}")
                     text = await response.text()
                     print(f"   Response: {text}")
                     return {"error": f"HTTP {response.status}", "response": text}
@@ -66,6 +72,33 @@ class BindSyncTester:
             print(f"❌ Get messages error: {e}")
             return {"error": str(e)}
 
+    async def test_search_messages(self, query: str = None, source: str = None, username: str = None, limit: int = 10) -> Dict[str, Any]:
+        print(f"🔎 Testing search messages (q={query}, source={source}, username={username})...")
+        headers = {}
+        if self.api_token:
+            headers['X-API-Token'] = self.api_token
+        params = {"limit": limit}
+        if query:
+            params["q"] = query
+        if source:
+            params["source"] = source
+        if username:
+            params["username"] = username
+        try:
+            async with self.session.get(f"{self.base_url}/messages/search", params=params, headers=headers) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    print(f"✅ Search returned {data.get('count', 0)} messages!")
+                    return data
+                else:
+                    print(f"❌ Search failed with status: {response.status}")
+                    text = await response.text()
+                    print(f"   Response: {text}")
+                    return {"error": f"HTTP {response.status}", "response": text}
+        except Exception as e:
+            print(f"❌ Search error: {e}")
+            return {"error": str(e)}
+
     async def test_send_message(self, username: str = "TestUser", text: str = "Hello from test script!", reply_to_id: Optional[str] = None) -> Dict[str, Any]:
         print(f"📤 Testing send message (user: {username}, text: '{text[:30]}...')...")
 
@@ -412,18 +445,18 @@ async def run_system_check():
         print("📊 SYSTEM CHECK SUMMARY")
         print("-" * 60)
 
-        health_ok = health_result.get('status') == 'healthy' if 'error' not in health_result else False
+        health_ok = health_result.get('status') == 'ready' if 'error' not in health_result else False
         admin_exists = status_result.get('admin_exists', False) if 'error' not in status_result else False
 
-        print(f"Health Status:        {'✅ HEALTHY' if health_ok else '❌ UNHEALTHY'}")
+        print(f"Health Status:        {'✅ READY' if health_ok else '❌ NOT READY'}")
         print(f"Admin Configured:     {'✅ YES' if admin_exists else '⚠️  NO (registration needed)'}")
 
-        if health_ok:
-            runtime = health_result.get('runtime', {})
-            print(f"Telegram Bot:         {'✅ RUNNING' if runtime.get('telegram_bot') else '❌ NOT RUNNING'}")
-            print(f"Discord Bot:          {'✅ RUNNING' if runtime.get('discord_bot') else '❌ NOT RUNNING'}")
-            print(f"Slack Bot:            {'✅ RUNNING' if runtime.get('slack_bot') else '❌ NOT RUNNING'}")
-            print(f"Database:             {'✅ CONNECTED' if runtime.get('api_configured') else '❌ DISCONNECTED'}")
+        if 'error' not in health_result:
+            checks = health_result.get('checks', {})
+            print(f"Telegram Bot:         {'✅ RUNNING' if checks.get('telegram', {}).get('ok') else '❌ NOT RUNNING'}")
+            print(f"Discord Bot:          {'✅ RUNNING' if checks.get('discord', {}).get('ok') else '❌ NOT RUNNING'}")
+            print(f"Slack Bot:            {'✅ RUNNING' if checks.get('slack', {}).get('ok') else '❌ NOT RUNNING'}")
+            print(f"Database:             {'✅ CONNECTED' if checks.get('database', {}).get('ok') else '❌ DISCONNECTED'}")
 
         print("=" * 60)
 
@@ -0,0 +1,65 @@
+from src.core import circuit
+from src.core.circuit import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+def tripped(monkeypatch, now=1000.0):
+    monkeypatch.setattr(circuit.time, "time", lambda: now)
+    breaker = CircuitBreaker("discord", failure_threshold=2, reset_timeout=30.0)
+    breaker.record_failure()
+    breaker.record_failure()
+    return breaker
+
+
+def test_opens_after_consecutive_failures(monkeypatch):
+    monkeypatch.setattr(circuit.time, "time", lambda: 1000.0)
+    breaker = CircuitBreaker("discord", failure_threshold=2, reset_timeout=30.0)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.retry_at() == 1030.0
+    assert breaker.snapshot()["rejected"] == 1
+    assert breaker.snapshot()["opened"] == 1
+
+
+def test_half_open_lets_a_single_probe_through(monkeypatch):
+    breaker = tripped(monkeypatch)
+    monkeypatch.setattr(circuit.time, "time", lambda: 1030.0)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_probe_reopens(monkeypatch):
+    breaker = tripped(monkeypatch)
+    monkeypatch.setattr(circuit.time, "time", lambda: 1031.0)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.opened_at == 1031.0
+    assert not breaker.allow()
+
+
+def test_release_frees_the_probe_without_a_verdict(monkeypatch):
+    breaker = tripped(monkeypatch)
+    monkeypatch.setattr(circuit.time, "time", lambda: 1030.0)
+    assert breaker.allow()
+    # e.g. the probing delivery was cancelled or deferred before it could send
+    breaker.release()
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_release_when_closed_changes_nothing():
+    breaker = CircuitBreaker("slack")
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state == CLOSED
+    assert breaker.failures == 0
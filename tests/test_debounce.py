@@ -0,0 +1,75 @@
+import asyncio
+
+from src.utils.debounce import Debouncer
+
+
+def recorder(calls, value):
+    async def action():
+        calls.append(value)
+    return action
+
+
+def test_only_the_latest_action_per_key_runs():
+    async def body():
+        debouncer = Debouncer(delay=0.02)
+        calls = []
+        debouncer.schedule("a", recorder(calls, "a1"))
+        debouncer.schedule("a", recorder(calls, "a2"))
+        debouncer.schedule("b", recorder(calls, "b1"))
+        await asyncio.sleep(0.01)
+        debouncer.schedule("a", recorder(calls, "a3"))
+        await asyncio.sleep(0.05)
+        return calls, debouncer.pending, debouncer.timers
+
+    calls, pending, timers = asyncio.run(body())
+    assert sorted(calls) == ["a3", "b1"]
+    assert pending == {} and timers == {}
+
+
+def test_runs_are_spaced_by_min_interval():
+    async def body():
+        loop = asyncio.get_running_loop()
+        debouncer = Debouncer(delay=0, min_interval=0.05)
+        times = []
+
+        async def stamp():
+            times.append(loop.time())
+
+        for key in range(3):
+            debouncer.schedule(key, stamp)
+        await asyncio.sleep(0.2)
+        return times
+
+    times = asyncio.run(body())
+    assert len(times) == 3
+    assert all(b - a >= 0.04 for a, b in zip(times, times[1:]))
+
+
+def test_failing_action_does_not_stop_others():
+    async def body():
+        debouncer = Debouncer(delay=0)
+        calls = []
+
+        async def boom():
+            raise RuntimeError("send failed")
+
+        debouncer.schedule("a", boom)
+        debouncer.schedule("b", recorder(calls, "b"))
+        await asyncio.sleep(0.02)
+        return calls
+
+    assert asyncio.run(body()) == ["b"]
+
+
+def test_flush_runs_queued_actions_immediately():
+    async def body():
+        debouncer = Debouncer(delay=60)
+        calls = []
+        debouncer.schedule("a", recorder(calls, "a1"))
+        debouncer.schedule("a", recorder(calls, "a2"))
+        await debouncer.flush()
+        return calls, debouncer.timers
+
+    calls, timers = asyncio.run(body())
+    assert calls == ["a2"]
+    assert timers == {}
@@ -0,0 +1,69 @@
+import pytest
+from pydantic import ValidationError
+
+from src.api import server
+from src.auth import rate_limit
+from src.auth.rate_limit import SlidingWindowLimiter
+from src.core.models import TokenCreate
+
+
+def test_limiter_refuses_past_the_limit():
+    limiter = SlidingWindowLimiter(window=60)
+    assert limiter.hit("k", 3, now=0) == 0
+    assert limiter.hit("k", 3, cost=2, now=1) == 0
+    assert limiter.hit("k", 3, now=2) == 58
+    # A refused hit isn't counted
+    assert limiter.usage("k", now=2) == 3
+    # Other keys have their own window
+    assert limiter.hit("other", 3, cost=3, now=2) == 0
+
+
+def test_limiter_weights_the_previous_window():
+    limiter = SlidingWindowLimiter(window=60)
+    limiter.hit("k", 10, cost=10, now=59)
+    # A quarter into the next window, three quarters of the last one still count
+    assert limiter.usage("k", now=75) == pytest.approx(7.5)
+    assert limiter.hit("k", 10, cost=3, now=75) == 45
+    assert limiter.hit("k", 10, cost=2, now=75) == 0
+    # Two windows on, nothing is left
+    assert limiter.usage("k", now=185) == 0
+
+
+def test_zero_limit_is_unlimited():
+    limiter = SlidingWindowLimiter(window=60)
+    assert limiter.hit("k", 0, cost=1000, now=0) == 0
+
+
+def test_check_messages_uses_the_token_quota(monkeypatch):
+    monkeypatch.setattr(rate_limit, "message_limiter", SlidingWindowLimiter())
+    monkeypatch.setattr(rate_limit, "pending_usage", {})
+    token = {"token_hash": "h", "messages_per_minute": 3}
+    assert rate_limit.check_messages(token, 3) == 0
+    assert rate_limit.check_messages(token, 1) > 0
+    assert rate_limit.pending_usage["h"]["messages"] == 3
+
+
+@pytest.mark.parametrize("value", [1, 2, -1])
+def test_token_message_quota_below_a_broadcast_is_rejected(value):
+    with pytest.raises(ValidationError):
+        TokenCreate(name="t", messages_per_minute=value)
+
+
+def test_token_quota_bounds():
+    with pytest.raises(ValidationError):
+        TokenCreate(name="t", requests_per_minute=-1)
+    token = TokenCreate(name="t", requests_per_minute=0, messages_per_minute=0)
+    assert (token.requests_per_minute, token.messages_per_minute) == (0, 0)
+    assert TokenCreate(name="t", messages_per_minute=3).messages_per_minute == 3
+
+
+def test_delivery_targets_follow_configured_platforms(monkeypatch):
+    monkeypatch.setattr(server, "tg_client", object())
+    monkeypatch.setattr(server, "dbot", object())
+    monkeypatch.setattr(server, "slack_bot", None)
+    monkeypatch.setattr(server, "cfg", {"telegram_chat_id": 1, "discord_channel_id": 2})
+    assert server.delivery_targets(None) == ["telegram", "discord"]
+    assert server.delivery_targets("discord") == ["discord"]
+    assert server.delivery_targets("slack") == []
+    # A reply only goes where the original message has a copy
+    assert server.delivery_targets(None, {"dc_msg_id": 5}) == ["discord"]
@@ -0,0 +1,219 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from src.database.sqlite_backend import TAG, open_database
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def with_db(tmp_path, body):
+    db = await open_database(str(tmp_path / "test.db"))
+    try:
+        return await body(db)
+    finally:
+        await db.engine.close()
+
+
+def seed(n=5):
+    base = datetime(2024, 1, 1)
+    return [
+        {
+            "_id": ObjectId(),
+            "s": ["telegram", "discord", "slack"][i % 3],
+            "t": f"message {i}",
+            "u": f"user{i % 2}",
+            "ts": base + timedelta(minutes=i),
+            "p": {"tg": 100 + i} if i % 2 == 0 else {"dc": str(200 + i)},
+            "tags": ["even"] if i % 2 == 0 else ["odd", "x"],
+            "n": i,
+        }
+        for i in range(n)
+    ]
+
+
+def test_query_operators(tmp_path):
+    async def body(db):
+        docs = seed()
+        await db.messages.insert_many(docs)
+        await db.messages.create_index([("ts", 1)])
+
+        async def ns(flt):
+            return sorted(d["n"] for d in await db.messages.find(flt).to_list(None))
+
+        assert await ns({"s": "telegram"}) == [0, 3]
+        assert await ns({"s": {"$eq": "discord"}}) == [1, 4]
+        assert await ns({"s": {"$ne": "telegram"}}) == [1, 2, 4]
+        assert await ns({"n": {"$gt": 2}}) == [3, 4]
+        assert await ns({"n": {"$gte": 2, "$lt": 4}}) == [2, 3]
+        assert await ns({"n": {"$lte": 1}}) == [0, 1]
+        assert await ns({"ts": {"$gte": datetime(2024, 1, 1, 0, 3)}}) == [3, 4]
+        assert await ns({"_id": {"$lt": docs[2]["_id"]}}) == [0, 1]
+        assert await ns({"s": {"$in": ["slack", "discord"]}}) == [1, 2, 4]
+        assert await ns({"p.tg": {"$exists": True}}) == [0, 2, 4]
+        assert await ns({"p.dc": {"$exists": False}}) == [0, 2, 4]
+        assert await ns({"p.tg": 102}) == [2]
+        assert await ns({"p.dc": "201"}) == [1]
+        assert await ns({"$or": [{"n": 0}, {"u": "user1"}]}) == [0, 1, 3]
+        assert await ns({"t": {"$regex": "MESSAGE [34]", "$options": "i"}}) == [3, 4]
+        assert await ns({"tags": "odd"}) == [1, 3]
+        assert await ns({"missing": None}) == [0, 1, 2, 3, 4]
+
+    run(with_db(tmp_path, body))
+
+
+def test_sort_skip_limit_and_projection(tmp_path):
+    async def body(db):
+        await db.messages.insert_many(seed())
+
+        newest = await db.messages.find({}).sort("ts", -1).limit(2).to_list(None)
+        assert [d["n"] for d in newest] == [4, 3]
+
+        page = await db.messages.find({}, sort=[("n", 1)], skip=1, limit=2).to_list(None)
+        assert [d["n"] for d in page] == [1, 2]
+
+        filtered = await db.messages.find({"tags": "odd"}).sort("n", -1).skip(1).limit(5).to_list(None)
+        assert [d["n"] for d in filtered] == [1]
+
+        first = await db.messages.find_one({"s": "telegram"}, sort=[("n", -1)])
+        assert first["n"] == 3
+
+        included = await db.messages.find_one({"n": 0}, {"t": 1, "p.tg": 1})
+        assert set(included) == {"_id", "t", "p"}
+        assert included["p"] == {"tg": 100}
+
+        no_id = await db.messages.find_one({"n": 0}, {"t": 1, "_id": 0})
+        assert no_id == {"t": "message 0"}
+
+        excluded = await db.messages.find_one({"n": 0}, {"tags": 0, "p": 0})
+        assert "tags" not in excluded and "p" not in excluded and excluded["t"] == "message 0"
+
+        streamed = [d["n"] async for d in db.messages.find({"u": "user0"}).sort("n", 1)]
+        assert streamed == [0, 2, 4]
+
+    run(with_db(tmp_path, body))
+
+
+def test_update_operators(tmp_path):
+    async def body(db):
+        doc = {"_id": ObjectId(), "t": "hi", "a": {"x": 1}, "c": 1}
+        await db.messages.insert_one(doc)
+
+        result = await db.messages.update_one({"_id": doc["_id"]}, {
+            "$set": {"t": "edited", "a.y": 2},
+            "$inc": {"c": 2, "fresh": 1},
+            "$unset": {"a.x": ""},
+            "$push": {"h": "first"},
+        })
+        assert (result.matched_count, result.modified_count) == (1, 1)
+        stored = await db.messages.find_one({"_id": doc["_id"]})
+        assert stored["t"] == "edited"
+        assert stored["a"] == {"y": 2}
+        assert (stored["c"], stored["fresh"]) == (3, 1)
+        assert stored["h"] == ["first"]
+
+        await db.messages.update_one({"_id": doc["_id"]}, {"$push": {"h": "second"}, "$min": {"c": 0}, "$max": {"fresh": 9}})
+        stored = await db.messages.find_one({"_id": doc["_id"]})
+        assert stored["h"] == ["first", "second"]
+        assert (stored["c"], stored["fresh"]) == (0, 9)
+
+        unchanged = await db.messages.update_one({"_id": doc["_id"]}, {"$set": {"t": "edited"}})
+        assert (unchanged.matched_count, unchanged.modified_count) == (1, 0)
+
+        missed = await db.messages.update_one({"t": "nope"}, {"$set": {"t": "x"}})
+        assert (missed.matched_count, missed.upserted_id) == (0, None)
+
+    run(with_db(tmp_path, body))
+
+
+def test_update_one_touches_a_single_match(tmp_path):
+    async def body(db):
+        await db.messages.insert_many(seed())
+
+        one = await db.messages.update_one({"u": "user0"}, {"$set": {"flag": True}})
+        assert (one.matched_count, one.modified_count) == (1, 1)
+        assert await db.messages.count_documents({"flag": True}) == 1
+
+        # A filter SQL can't fully express still stops at the first match
+        one = await db.messages.update_one({"tags": "odd"}, {"$set": {"odd": True}})
+        assert one.matched_count == 1
+        assert await db.messages.count_documents({"odd": True}) == 1
+
+        many = await db.messages.update_many({"u": "user0"}, {"$set": {"flag": True}})
+        assert (many.matched_count, many.modified_count) == (3, 2)
+
+        deleted = await db.messages.delete_one({"u": "user0"})
+        assert deleted.deleted_count == 1
+        deleted = await db.messages.delete_many({"u": "user0"})
+        assert deleted.deleted_count == 2
+        assert await db.messages.count_documents({}) == 2
+
+    run(with_db(tmp_path, body))
+
+
+def test_upsert_and_find_one_and_update(tmp_path):
+    async def body(db):
+        result = await db.counters.update_one(
+            {"_id": "k", "kind": "day"}, {"$inc": {"n": 1}, "$setOnInsert": {"created": "now"}}, upsert=True)
+        assert result.upserted_id == "k"
+        await db.counters.update_one(
+            {"_id": "k", "kind": "day"}, {"$inc": {"n": 1}, "$setOnInsert": {"created": "later"}}, upsert=True)
+        assert await db.counters.find_one({"_id": "k"}) == {"_id": "k", "kind": "day", "n": 2, "created": "now"}
+
+        before = await db.counters.find_one_and_update({"_id": "k"}, {"$inc": {"n": 5}})
+        assert before["n"] == 2
+        after = await db.counters.find_one_and_update({"_id": "k"}, {"$inc": {"n": 1}}, return_document=True)
+        assert after["n"] == 8
+
+        created = await db.counters.find_one_and_update(
+            {"_id": "j"}, {"$set": {"n": 1}}, upsert=True, return_document=True)
+        assert created == {"_id": "j", "n": 1}
+        assert await db.counters.find_one_and_update({"_id": "z"}, {"$set": {"n": 1}}) is None
+
+    run(with_db(tmp_path, body))
+
+
+def test_unique_indexes(tmp_path):
+    async def body(db):
+        await db.messages.create_index([("p.tg", 1)], sparse=True, unique=True)
+        doc = {"_id": ObjectId(), "p": {"tg": 1}}
+        await db.messages.insert_one(doc)
+        with pytest.raises(DuplicateKeyError):
+            await db.messages.insert_one({"_id": ObjectId(), "p": {"tg": 1}})
+        with pytest.raises(DuplicateKeyError):
+            await db.messages.insert_one({"_id": doc["_id"], "p": {"tg": 2}})
+        # Sparse: documents without the key don't collide with each other
+        await db.messages.insert_one({"_id": ObjectId(), "p": {"dc": "a"}})
+        await db.messages.insert_one({"_id": ObjectId(), "p": {"dc": "b"}})
+        assert await db.messages.count_documents({}) == 3
+
+    run(with_db(tmp_path, body))
+
+
+def test_persists_across_reopen(tmp_path):
+    doc = {"_id": ObjectId(), "ts": datetime(2024, 5, 1, 12, 30), "b": b"\x00\x01"}
+
+    async def write(db):
+        await db.messages.insert_one(dict(doc))
+
+    async def read(db):
+        return await db.messages.find_one({"_id": doc["_id"]})
+
+    run(with_db(tmp_path, write))
+    assert run(with_db(tmp_path, read)) == doc
+
+
+def test_text_starting_with_the_tag_round_trips(tmp_path):
+    async def body(db):
+        text = TAG + "O:hello"
+        await db.messages.insert_one({"_id": ObjectId(), "t": text, "tags": [TAG + "D:x"]})
+        assert [d["t"] for d in await db.messages.find({}).to_list(None)] == [text]
+        assert (await db.messages.find_one({"t": text}))["tags"] == [TAG + "D:x"]
+        assert await db.messages.count_documents({"t": {"$regex": "hello"}}) == 1
+
+    run(with_db(tmp_path, body))
@@ -0,0 +1,126 @@
+import asyncio
+import time
+
+import pytest
+from bson import ObjectId
+
+from src.database import database, migrate_schema, store_functions
+from src.database.store_functions import FIELD_PATHS, api_shape, compact, id_before, new_id, projection
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def with_store(tmp_path, body):
+    await database.init_sqlite(str(tmp_path / "store.db"))
+    try:
+        return await body(database.get_db())
+    finally:
+        await database.close_db()
+
+
+def test_compact_and_api_shape_round_trip():
+    parent = ObjectId()
+    fields = {
+        "source": "discord", "text": "hi", "username": "ann", "timestamp": 1700000000.5,
+        "tg_msg_id": 7, "dc_msg_id": 8, "slack_ts": "1.2", "reply_to_id": parent, "reply_to_tg_id": 3,
+        "reply_to_dc_id": None, "reply_to_slack_ts": None, "thread_root": parent,
+        "attachments": [{"name": "a.png"}], "reactions": {"discord": {"👍": 1}},
+    }
+    doc = compact(fields)
+    assert doc["p"] == {"tg": 7, "dc": 8, "sk": "1.2"}
+    assert doc["rp"] == {"tg": 3}
+    assert "reply_to_dc_id" not in doc and "rp.dc" not in doc
+
+    doc["_id"] = ObjectId()
+    shaped = api_shape(doc)
+    assert shaped["id"] == str(doc["_id"])
+    # Internal ids come back as strings, everything else as stored
+    assert shaped["reply_to_id"] == shaped["thread_root"] == str(parent)
+    expected = {k: v for k, v in fields.items() if v is not None and k not in ("reply_to_id", "thread_root")}
+    assert {k: v for k, v in shaped.items() if k in expected} == expected
+    assert set(shaped) == set(expected) | {"id", "reply_to_id", "thread_root"}
+
+
+def test_projection_maps_api_names():
+    assert projection(None) is None
+    assert projection(("text", "tg_msg_id")) == {"t": 1, "p.tg": 1}
+    assert set(FIELD_PATHS) == store_functions.MESSAGE_FIELDS
+
+
+def test_new_id_orders_by_timestamp_then_insertion():
+    ids = [new_id(1700000000) for _ in range(5)]
+    assert ids == sorted(ids)
+    assert all(i.generation_time.timestamp() == 1700000000 for i in ids)
+    assert new_id(1699999999) < ids[0] < new_id(1700000001)
+    assert new_id(1700000000.9).generation_time.timestamp() == 1700000000
+
+
+def test_id_before_bounds_and_clamps():
+    oid = new_id(1700000000)
+    assert id_before(1700000000) <= oid < id_before(1700000001)
+    assert id_before(-5) == ObjectId(bytes(12))
+    assert id_before(2 ** 40).generation_time.timestamp() == 0xFFFFFFFF
+
+
+def test_search_filter_falls_back_to_text_and_username(monkeypatch):
+    monkeypatch.setattr(store_functions, "text_index_ready", False)
+    flt = store_functions.search_filter(query="a.b", source="slack", since=100, until=200)
+    assert flt["$or"] == [{"t": {"$regex": r"a\.b", "$options": "i"}}, {"u": {"$regex": r"a\.b", "$options": "i"}}]
+    assert flt["s"] == "slack"
+    assert flt["ts"] == {"$gte": 100.0, "$lte": 200.0}
+    assert flt["_id"] == {"$gte": id_before(100), "$lt": id_before(201)}
+    monkeypatch.setattr(store_functions, "text_index_ready", True)
+    assert store_functions.search_filter(query="x") == {"$text": {"$search": "x"}}
+
+
+def test_add_message_stores_once_per_platform_id(tmp_path):
+    async def body(db):
+        await store_functions.configure()
+        first = await store_functions.add_message("telegram", "hi", username="ann", tg_msg_id=5, timestamp=1700000000)
+        again = await store_functions.add_message("telegram", "hi", username="ann", tg_msg_id=5, timestamp=1700000000)
+        reply = await store_functions.add_message("discord", "re", username="bo", dc_msg_id=9, reply_to_id=first)
+        stored = await store_functions.get_message(first)
+        thread = await store_functions.get_message(reply)
+        return first, again, stored, thread
+
+    first, again, stored, thread = run(with_store(tmp_path, body))
+    assert again is None
+    assert stored["timestamp"] == 1700000000
+    assert ObjectId(first).generation_time.timestamp() == 1700000000
+    assert thread["reply_to_id"] == first and thread["thread_root"] == first
+
+
+def test_migration_converts_legacy_documents_once(tmp_path):
+    async def body(db):
+        now = time.time()
+        await db.messages.insert_many([
+            {"_id": "u1", "source": "telegram", "text": "a", "username": "ann", "tg_msg_id": 1, "timestamp": now - 10},
+            {"_id": "u2", "source": "discord", "text": "b", "reply_to_id": "u1", "timestamp": now},
+        ])
+        first = await migrate_schema.migrate_messages()
+        # Legacy documents written after the marker are left alone
+        await db.messages.insert_one({"_id": "u3", "source": "slack", "text": "c", "timestamp": now})
+        second = await migrate_schema.migrate_messages()
+        docs = await db.messages.find({"lid": {"$exists": True}}, sort=[("_id", 1)]).to_list(None)
+        return first, second, docs
+
+    first, second, docs = run(with_store(tmp_path, body))
+    assert (first, second) == (2, 0)
+    assert [d["lid"] for d in docs] == ["u1", "u2"]
+    assert docs[0]["p"] == {"tg": 1} and docs[0]["t"] == "a"
+    assert docs[1]["r"] == docs[0]["_id"]
+    assert all(isinstance(d["_id"], ObjectId) for d in docs)
+
+
+@pytest.mark.parametrize("legacy_id", ["u1", "c0ffee00-0000-4000-8000-000000000000"])
+def test_legacy_ids_still_resolve_after_migration(tmp_path, legacy_id):
+    async def body(db):
+        await db.messages.insert_one({"_id": legacy_id, "source": "api", "text": "x", "timestamp": time.time()})
+        await migrate_schema.migrate_messages()
+        return await store_functions.get_message(legacy_id)
+
+    message = run(with_store(tmp_path, body))
+    assert message["text"] == "x"
+    assert ObjectId.is_valid(message["id"])
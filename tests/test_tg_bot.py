@@ -0,0 +1,64 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from src.bot import tg_bot
+from src.bot.tg_bot import TelegramBot
+
+
+class RecordingRelay:
+    def __init__(self):
+        self.edits = []
+        self.deletes = []
+
+    async def edited(self, source, message_id, text):
+        self.edits.append((source, message_id, text))
+
+    async def deleted(self, source, message_id):
+        self.deletes.append((source, message_id))
+
+
+def bot(chat_id):
+    b = TelegramBot(chat_id=chat_id, api_id=1, api_hash="x", bot_token="t")
+    b.set_edit_relay(RecordingRelay())
+    return b
+
+
+def test_basic_group_detection():
+    assert bot(-123).is_basic_group()
+    assert not bot(-1001234567890).is_basic_group()
+
+
+@pytest.mark.parametrize("chat_id, event_chat, expected", [
+    (-1001234567890, -1001234567890, [("telegram", 5)]),
+    (-1001234567890, -1009999999999, []),
+    # No chat id: only a basic group shares the id sequence of such deletions
+    (-1001234567890, None, []),
+    (-123, None, [("telegram", 5)]),
+])
+def test_handle_delete_filters_by_chat(chat_id, event_chat, expected):
+    b = bot(chat_id)
+    asyncio.run(b.handle_delete(SimpleNamespace(chat_id=event_chat, deleted_ids=[5])))
+    assert b.edit_relay.deletes == expected
+
+
+def test_outgoing_edits_only_relay_telegram_messages(monkeypatch):
+    stored = {1: {"source": "telegram"}, 2: {"source": "api"}}
+
+    async def find_by_tg_id(message_id):
+        return stored.get(message_id)
+
+    monkeypatch.setattr(tg_bot.store_functions, "find_by_tg_id", find_by_tg_id)
+    b = bot(-100)
+
+    def edit(message_id, text, out=True):
+        event = SimpleNamespace(chat_id=-100, out=out, message=SimpleNamespace(id=message_id, text=text))
+        asyncio.run(b.handle_edit(event))
+
+    edit(1, "mine")
+    edit(2, "[API] copy")
+    edit(3, "unknown")
+    edit(4, "someone else's", out=False)
+    edit(5, "[DC] mirrored", out=False)
+    assert b.edit_relay.edits == [("telegram", 1, "mine"), ("telegram", 4, "someone else's")]